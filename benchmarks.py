@@ -0,0 +1,348 @@
+from time import perf_counter
+import argparse
+import sys
+import os
+import io
+import json
+import logging
+import subprocess
+import tempfile
+import threading
+import tracemalloc
+
+import requests
+
+from exodusquery import ExodusClient, ExodusQuery, JSONLinesSink, MarketSnapshot, SnapshotLog, TradeChainSearch, \
+    TradeDirection, display_trade_table
+from mock_exodus import MockExodusServer, SyntheticMarket
+
+_logger = logging.getLogger("benchmarks")
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cryptoquery.py")
+
+
+class FixtureSession(object):
+    """
+    Stand-in for requests.Session which answers from pre-encoded response bodies, so the client's decoding and
+    parsing can be measured without any network traffic.
+    """
+
+    def __init__(self, pairs_body, prices_body):
+        self.pairs_body = pairs_body
+        self.prices_body = prices_body
+
+    @staticmethod
+    def _response(body):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = body
+        response.raw = io.BytesIO(body)
+        response.encoding = "utf-8"
+        return response
+
+    def get(self, url, **kwargs):
+        return self._response(self.pairs_body)
+
+    def post(self, url, **kwargs):
+        return self._response(self.prices_body)
+
+    def close(self):
+        return
+
+
+class BenchmarkFixture(object):
+    """
+    A market to benchmark against: a snapshot for the analysis benchmarks, and the encoded API responses it was
+    built from for the refresh benchmark.
+    """
+
+    def __init__(self, name, snapshot, symbols):
+        self.name = name
+        self.snapshot = snapshot
+        self.symbols = list(symbols)
+        self.pairs_body = json.dumps({
+            "status": "success",
+            "data": [{"pair": "{}_{}".format(x.left.symbol, x.right.symbol), "rate": x.conversion_rate}
+                     for x in snapshot.trade_pairs]
+        }).encode("utf-8")
+        self.prices_body = json.dumps(snapshot.symbol_price_data).encode("utf-8")
+
+    @classmethod
+    def synthetic(cls, symbols, density, cycles, seed):
+        market = SyntheticMarket(symbols=symbols, density=density, cycles=cycles, seed=seed)
+        return cls("synthetic-{}x{}".format(symbols, density), market.snapshot(), market.symbols)
+
+    @classmethod
+    def recorded(cls, path, index=-1):
+        log = SnapshotLog(path)
+        index = index if index >= 0 else len(log) + index
+        fetched_at, currencies, trade_graph, symbol_price_data = list(log.records(index, index + 1))[0]
+        snapshot = MarketSnapshot(trade_graph, symbol_price_data, currencies[0], fetched_at=fetched_at,
+                                  currencies=currencies)
+        return cls("recorded-{}".format(os.path.basename(path)), snapshot, sorted(trade_graph.symbols))
+
+    def query(self):
+        """
+        :return: ExodusQuery holding this fixture's snapshot, asking for prices of every fixture symbol.
+        """
+        return ExodusQuery.from_snapshot(self.snapshot, self.symbols)
+
+
+def measure(operation, min_time, min_iterations, trace_memory=True):
+    """
+    Run `operation` repeatedly and summarise its timings.
+    :param operation: callable taking no arguments.
+    :param min_time: float minimum number of seconds to spend running the operation.
+    :param min_iterations: int minimum number of times to run the operation.
+    :param trace_memory: bool, run once more under tracemalloc to find the peak memory allocated.
+    :return: dict() of results.
+    """
+    timings = []
+    started = perf_counter()
+    while len(timings) < min_iterations or perf_counter() - started < min_time:
+        start = perf_counter()
+        operation()
+        timings.append(perf_counter() - start)
+    timings.sort()
+    result = {
+        "iterations": len(timings),
+        "ops_per_sec": len(timings) / sum(timings) if sum(timings) else None,
+        "mean_ms": 1000 * sum(timings) / len(timings),
+        "p50_ms": 1000 * percentile(timings, 50),
+        "p95_ms": 1000 * percentile(timings, 95),
+        "p99_ms": 1000 * percentile(timings, 99),
+        "peak_kib": None,
+    }
+    if trace_memory:
+        tracemalloc.start()
+        operation()
+        result["peak_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return result
+
+
+def percentile(sorted_values, p):
+    index = (len(sorted_values) - 1) * p / 100.0
+    lower = int(index)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (index - lower)
+
+
+def benchmark_refresh(fixture):
+    query = fixture.query()
+    query.client = ExodusClient()
+    query.client.open()
+    query.client.session = FixtureSession(fixture.pairs_body, fixture.prices_body)
+    return query.refresh
+
+
+def benchmark_trade_ranking(fixture, count=0):
+    holdings = [(x, 1) for x in fixture.symbols]
+    return lambda: fixture.snapshot.get_available_trades_for_holdings(holdings, direction=TradeDirection.DIR_FRM,
+                                                                      count=count)
+
+
+def benchmark_chain_search(fixture, depth, top_k, node_budget, workers=0):
+    query = fixture.query()
+    return lambda: TradeChainSearch(query, max_depth=depth, top_k=top_k, node_budget=node_budget,
+                                    workers=workers).search()
+
+
+def benchmark_trade_table(fixture, rows):
+    holdings = [(x, 1) for x in fixture.symbols]
+    available_trades = fixture.snapshot.get_available_trades_for_holdings(holdings, direction=TradeDirection.DIR_FRM)
+    trades = sorted([x for v in available_trades.values() for x in v], key=lambda x: x.ratio, reverse=True)
+    return lambda: display_trade_table({"": trades}, max_lines=rows)
+
+
+def benchmark_trade_records(fixture, rows):
+    holdings = [(x, 1) for x in fixture.symbols]
+    available_trades = fixture.snapshot.get_available_trades_for_holdings(holdings, direction=TradeDirection.DIR_FRM)
+    trades = sorted([x for v in available_trades.values() for x in v], key=lambda x: x.ratio, reverse=True)
+    sink = JSONLinesSink(os.devnull)
+    return lambda: display_trade_table({"": trades}, max_lines=rows, sink=sink)
+
+
+def benchmark_startup(argv):
+    """
+    :param argv: list of cryptoquery.py arguments.
+    :return: callable running cryptoquery.py with `argv` in a fresh interpreter, so its imports are included.
+    """
+    command = [sys.executable, SCRIPT] + list(argv)
+    return lambda: subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+
+def run_startup_benchmarks(args):
+    """
+    Measure the wall time of whole cryptoquery.py invocations against a local mock server, from interpreter start
+    to exit.
+    :return: dict() of results.
+    """
+    market = SyntheticMarket(symbols=args.symbols[0], density=args.density, cycles=args.cycles, seed=args.seed)
+    server = MockExodusServer(("127.0.0.1", 0), market)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        holdings = os.path.join(directory, "holdings.json")
+        with open(holdings, "wt") as f_holdings:
+            json.dump({x: 1 for x in market.symbols[:3]}, f_holdings)
+        common = ["--no-daemon", "--pricing-url", server.base_url, "--exchange-url", server.base_url,
+                  "--holdings", holdings]
+        uncached = ["--no-cache"] + common
+        cached = ["--cache-dir", directory] + common
+        cases = [
+            ("help", benchmark_startup(["--help"])),
+            ("holding_value", benchmark_startup(uncached + ["holding", "value"])),
+            ("holding_value_cached", benchmark_startup(cached + ["holding", "value"])),
+            ("generic_prices", benchmark_startup(uncached + ["generic", "prices"])),
+            ("profitable_trades", benchmark_startup(uncached + ["holding", "profitable-trades"])),
+        ]
+        # fill the cache for the cached case
+        benchmark_startup(cached + ["holding", "value"])()
+        for name, operation in cases:
+            key = "startup/{}".format(name)
+            if args.only and not any(x in key for x in args.only):
+                continue
+            results[key] = measure(operation, args.min_time, args.min_iterations, trace_memory=False)
+            report(key, results[key])
+    server.shutdown()
+    server.server_close()
+    return results
+
+
+def run_benchmarks(args):
+    fixtures = []
+    if args.recorded:
+        fixtures.append(BenchmarkFixture.recorded(args.recorded))
+    else:
+        for symbols in args.symbols:
+            fixtures.append(BenchmarkFixture.synthetic(symbols, args.density, args.cycles, args.seed))
+
+    results = {}
+    for fixture in fixtures:
+        _logger.info("{}: {} symbols, {} pairs".format(fixture.name, len(fixture.symbols),
+                                                       len(fixture.snapshot.trade_pairs)))
+        cases = [
+            ("refresh", benchmark_refresh(fixture)),
+            ("trade_ranking", benchmark_trade_ranking(fixture)),
+            ("trade_ranking_top{}".format(args.top_k), benchmark_trade_ranking(fixture, args.top_k)),
+            ("trade_table", benchmark_trade_table(fixture, args.rows)),
+            ("trade_records_jsonl", benchmark_trade_records(fixture, args.rows)),
+        ]
+        for depth in args.depth:
+            cases.append(("chain_search_d{}".format(depth),
+                          benchmark_chain_search(fixture, depth, args.top_k, args.node_budget)))
+            if args.workers > 1:
+                cases.append(("chain_search_d{}_w{}".format(depth, args.workers),
+                              benchmark_chain_search(fixture, depth, args.top_k, args.node_budget, args.workers)))
+        for name, operation in cases:
+            if args.only and not any(x in name for x in args.only):
+                continue
+            key = "{}/{}".format(fixture.name, name)
+            results[key] = measure(operation, args.min_time, args.min_iterations, trace_memory=not args.no_memory)
+            report(key, results[key])
+
+    if not args.no_startup:
+        results.update(run_startup_benchmarks(args))
+    return results
+
+
+def report(key, result, baseline=None):
+    line = "{:48s} {:8d} it  {:10.1f} op/s  p50 {:9.3f}ms  p95 {:9.3f}ms  p99 {:9.3f}ms".format(
+        key, result["iterations"], result["ops_per_sec"] or 0, result["p50_ms"], result["p95_ms"], result["p99_ms"])
+    if result["peak_kib"] is not None:
+        line += "  peak {:10.1f}KiB".format(result["peak_kib"])
+    if baseline is not None:
+        line += "  {:+7.1f}%".format(100 * (result["p50_ms"] / baseline["p50_ms"] - 1))
+    _logger.info(line)
+    return
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare median latencies with a baseline.
+    :return: list of benchmark names which are more than `threshold` (a fraction) slower than the baseline.
+    """
+    _logger.info("")
+    _logger.info("comparison with baseline (median latency):")
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            _logger.info("{:48s} (not in baseline)".format(key))
+            continue
+        report(key, result, baseline[key])
+        if result["p50_ms"] > baseline[key]["p50_ms"] * (1 + threshold):
+            regressions.append(key)
+    return regressions
+
+
+def main(argv):
+    args = parse_arguments(argv)
+    # the trade table is logged by cryptoquery through the root logger: discard it, while still paying for the
+    # formatting, and report through a separate logger
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=open(os.devnull, "w"))
+    report_handler = logging.StreamHandler(sys.stdout)
+    report_handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(report_handler)
+    _logger.propagate = False
+
+    results = run_benchmarks(args)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "wt") as f_baseline:
+            json.dump(results, f_baseline, indent=2, sort_keys=True)
+        _logger.info("saved baseline to {}".format(args.save_baseline))
+
+    if args.baseline:
+        with open(args.baseline, "rt") as f_baseline:
+            baseline = json.load(f_baseline)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            _logger.info("")
+            _logger.info("{} benchmarks regressed by more than {:.0f}%: {}".format(
+                len(regressions), 100 * args.threshold, ", ".join(regressions)))
+            return 1
+    return 0
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the cryptoquery hot paths against offline fixtures")
+
+    parser.add_argument("--symbols", type=int, nargs="+", default=[140, 1000],
+                        help="Specify the sizes of synthetic market to benchmark (default:140 1000)")
+    parser.add_argument("--density", type=float, default=0.01,
+                        help="Specify the pair density of synthetic markets (default:0.01)")
+    parser.add_argument("--cycles", type=int, default=5,
+                        help="Specify the number of profitable cycles in synthetic markets (default:5)")
+    parser.add_argument("--seed", type=int, default=1, help="Specify the synthetic market seed (default:1)")
+    parser.add_argument("--recorded", metavar="PATH",
+                        help="Benchmark against the last snapshot of a log written with cryptoquery.py --record")
+    parser.add_argument("--depth", type=int, nargs="+", default=[3, 5],
+                        help="Specify the chain search depths to benchmark (default:3 5)")
+    parser.add_argument("--top-k", type=int, default=10,
+                        help="Specify the number of trades and chains the rankings keep (default:10)")
+    parser.add_argument("--node-budget", type=int, default=TradeChainSearch.DEFAULT_NODE_BUDGET,
+                        help="Specify the chain search node budget (default:{})".format(
+                            TradeChainSearch.DEFAULT_NODE_BUDGET))
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Also benchmark chain searches with this many worker processes (default:0 (none))")
+    parser.add_argument("--rows", type=int, default=0,
+                        help="Specify the number of trade table rows to format (default:0 (all))")
+    parser.add_argument("--only", nargs="+", help="Only run benchmarks whose name contains one of these strings")
+    parser.add_argument("--min-time", type=float, default=1.0,
+                        help="Specify the minimum number of seconds to run each benchmark for (default:1.0)")
+    parser.add_argument("--min-iterations", type=int, default=5,
+                        help="Specify the minimum number of iterations of each benchmark (default:5)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip measuring peak memory")
+    parser.add_argument("--no-startup", action="store_true",
+                        help="Skip measuring the start-up time of cryptoquery.py commands")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Save the results as a baseline to PATH")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare the results with the baseline at PATH")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Specify the fractional slowdown counted as a regression (default:0.1)")
+
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
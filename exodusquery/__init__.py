@@ -0,0 +1,96 @@
+"""
+Queries against the Exodus pricing and exchange APIs.
+
+Each subsystem lives in its own module: the HTTP client (client), the trade graph (graph, decode, matrix), market snapshots
+(market), the chain search (chains), the renderers (render), watch mode, replay, batches, alerts, the daemon and
+the command line (cli). Dependencies which are slow to import (requests, NumPy, multiprocessing, pyarrow) are only
+imported by the code paths which use them, and the names below are only imported from their module when they are
+first looked up on the package, so that commands only pay for loading what they run.
+"""
+import importlib
+
+_EXPORTS = {
+    "json_loads": "common",
+    "TradeDirection": "common",
+    "MetricsTimer": "metrics",
+    "MetricsRegistry": "metrics",
+    "PrometheusExporter": "metrics",
+    "StatsdExporter": "metrics",
+    "ExodusRoutes": "client",
+    "RateLimitedError": "client",
+    "CacheMissError": "client",
+    "ResponseCache": "client",
+    "ExodusClient": "client",
+    "TradeElement": "graph",
+    "TradePair": "graph",
+    "PairTable": "graph",
+    "decode_pairs_response": "decode",
+    "TradePairGraph": "graph",
+    "RateMatrix": "matrix",
+    "ExodusQuery": "market",
+    "MarketSnapshot": "market",
+    "SnapshotDelta": "market",
+    "TopTradeTracker": "market",
+    "ActiveTrade": "market",
+    "TradeChainNode": "chains",
+    "TradeChainSearch": "chains",
+    "produce_chain_tree": "chains",
+    "PollingScheduler": "watch",
+    "SnapshotRecorder": "replay",
+    "SnapshotLog": "replay",
+    "ReplayClient": "replay",
+    "SnapshotReplayer": "replay",
+    "OutputSink": "render",
+    "JSONLinesSink": "render",
+    "CSVSink": "render",
+    "ArrowSink": "render",
+    "ParquetSink": "render",
+    "OUTPUT_SINKS": "render",
+    "RecordListSink": "render",
+    "WebhookSink": "render",
+    "TableSink": "render",
+    "open_sink": "render",
+    "display_trade_table": "render",
+    "load_portfolios": "batch",
+    "PortfolioEvaluator": "batch",
+    "evaluate_portfolios": "batch",
+    "AlertRule": "alerts",
+    "load_alert_rules": "alerts",
+    "AlertEngine": "alerts",
+    "RequestLogCapture": "daemon",
+    "parse_daemon_address": "daemon",
+    "default_daemon_address": "daemon",
+    "QueryDaemon": "daemon",
+    "DaemonClient": "daemon",
+    "uses_daemon": "cli",
+    "handle_generic_query": "cli",
+    "handle_holding_query": "cli",
+    "QueryHandlerGeneric": "cli",
+    "QueryHandlerHolding": "cli",
+    "QueryHandlerBatch": "cli",
+    "QueryHandlerDaemon": "cli",
+    "main": "cli",
+    "start_exporters": "cli",
+    "parse_currencies": "cli",
+    "write_daemon_response": "cli",
+    "quoted_currencies": "cli",
+    "quoted_snapshot": "cli",
+    "is_watching": "cli",
+    "scheduler_from_args": "cli",
+    "parse_arguments": "cli",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module("." + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()).union(__all__))
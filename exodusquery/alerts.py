@@ -0,0 +1,212 @@
+from time import time
+import operator
+
+from .chains import TradeChainSearch
+from .market import ExodusQuery
+from .metrics import _metrics
+
+
+class AlertRule(object):
+    """
+    A threshold on one measure of the market, written as `KIND [SYMBOL...] OP THRESHOLD`, where KIND is one of:
+
+        price SYMBOL        the price of SYMBOL
+        ratio LEFT RIGHT    the ratio of the trade from LEFT to RIGHT
+        value [SYMBOL]      the value of the holding of SYMBOL, or of every holding
+        chain [SYMBOL]      the ratio of the best chain of profitable trades from SYMBOL, or from any holding
+
+    and OP is one of <, <=, > or >=.
+    """
+    __slots__ = ("kind", "symbols", "op", "threshold")
+    KINDS = {"price": (1, 1), "ratio": (2, 2), "value": (0, 1), "chain": (0, 1)}
+    OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+    def __init__(self, kind, symbols, op, threshold):
+        """
+        :param kind: str, one of KINDS.
+        :param symbols: tuple of the symbols the rule is about.
+        :param op: str, one of OPERATORS.
+        :param threshold: float
+        """
+        self.kind = kind
+        self.symbols = symbols
+        self.op = op
+        self.threshold = threshold
+
+    @classmethod
+    def parse(cls, text):
+        """
+        :param text: str holding a rule, such as `ratio BTC ETH > 1.002`.
+        :return: AlertRule
+        :raises ValueError: if `text` is not a valid rule.
+        """
+        fields = text.split()
+        if len(fields) < 3:
+            raise ValueError("expected KIND [SYMBOL...] OP THRESHOLD, got '{}'".format(text))
+        kind = fields[0].lower()
+        symbols = tuple(x.upper() for x in fields[1:-2])
+        if kind not in cls.KINDS:
+            raise ValueError("unknown kind of rule '{}'".format(fields[0]))
+        min_symbols, max_symbols = cls.KINDS[kind]
+        if not min_symbols <= len(symbols) <= max_symbols:
+            raise ValueError("{} rules take {} symbols".format(
+                kind, min_symbols if min_symbols == max_symbols else "{} or {}".format(min_symbols, max_symbols)))
+        if fields[-2] not in cls.OPERATORS:
+            raise ValueError("unknown operator '{}'".format(fields[-2]))
+        return cls(kind, symbols, fields[-2], float(fields[-1]))
+
+    def holds(self, value):
+        return self.OPERATORS[self.op](value, self.threshold)
+
+    @property
+    def text(self):
+        return " ".join((self.kind,) + self.symbols + (self.op, repr(self.threshold)))
+
+    def __eq__(self, other):
+        return isinstance(other, AlertRule) and self.text == other.text
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __repr__(self):
+        return "AlertRule({})".format(self.text)
+
+
+def load_alert_rules(path):
+    """
+    Read alert rules from a file with one rule per line. Blank lines, and everything after a `#`, are ignored.
+    :param path: str
+    :return: list of AlertRule objects.
+    :raises ValueError: naming the line of the first rule which cannot be parsed.
+    """
+    rules = []
+    with open(path, "rt") as f_rules:
+        for line_number, line in enumerate(f_rules, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                rules.append(AlertRule.parse(line))
+            except ValueError as e:
+                raise ValueError("line {}: {}".format(line_number, e))
+    return rules
+
+
+class AlertEngine(object):
+    """
+    Evaluates alert rules against each new snapshot. Rules are indexed by the prices and pairs they depend on, and
+    only the rules touched by the SnapshotDelta from the previous snapshot are evaluated again; chain rules depend on
+    the whole market, so they are evaluated on any change. A rule fires when it becomes true, then not again until
+    it has been false, nor within `cooldown` seconds (of snapshot time) of firing.
+    """
+    DEFAULT_COOLDOWN = 300.0
+
+    def __init__(self, rules, holdings=(), cooldown=DEFAULT_COOLDOWN, depth=TradeChainSearch.DEFAULT_MAX_DEPTH,
+                 node_budget=TradeChainSearch.DEFAULT_NODE_BUDGET):
+        """
+        :param rules: iterable of AlertRule objects. Repeated rules are only evaluated once.
+        :param holdings: list of (symbol, quantity) tuples, for value and chain rules.
+        :param cooldown: float minimum number of seconds between two alerts from the same rule.
+        :param depth: int specifying the maximum number of trades in a chain.
+        :param node_budget: int specifying the maximum number of nodes to expand for each chain search.
+        """
+        self.rules = list(dict.fromkeys(rules))
+        self.holdings = list(holdings)
+        self.cooldown = cooldown
+        self.depth = depth
+        self.node_budget = node_budget
+        self.snapshot = None
+        self.rules_evaluated = 0
+        self._quantities = dict(self.holdings)
+        self._active = [False] * len(self.rules)
+        self._last_fired = [None] * len(self.rules)
+        self._by_price = {}
+        self._by_pair = {}
+        self._on_any_change = []
+        for i, rule in enumerate(self.rules):
+            if rule.kind == "chain":
+                self._on_any_change.append(i)
+                continue
+            if rule.kind == "ratio":
+                self._by_pair.setdefault(rule.symbols, []).append(i)
+            for symbol in rule.symbols or self._quantities:
+                self._by_price.setdefault(symbol, []).append(i)
+
+    @property
+    def symbols(self):
+        """
+        :return: set of the symbols whose prices the rules depend on.
+        """
+        return set(self._by_price)
+
+    def update(self, snapshot):
+        """
+        Apply a new snapshot.
+        :param snapshot: MarketSnapshot, quoted in the currency of the price and value thresholds.
+        :return: list of alert records (dicts) for the rules which fired, in the order of the rules.
+        """
+        delta = snapshot.diff(self.snapshot)
+        self.snapshot = snapshot
+        if delta.is_full:
+            indices = range(len(self.rules))
+        elif not delta:
+            return []
+        else:
+            touched = set(self._on_any_change)
+            for symbol in delta.changed_prices:
+                touched.update(self._by_price.get(symbol, ()))
+            for key in delta.changed_pairs:
+                touched.update(self._by_pair.get(key, ()))
+            indices = sorted(touched)
+
+        now = snapshot.fetched_at if snapshot.fetched_at is not None else time()
+        chains = {}
+        alerts = []
+        for i in indices:
+            rule = self.rules[i]
+            value, chain = self._measure(rule, snapshot, chains)
+            self.rules_evaluated += 1
+            if value is None or not rule.holds(value):
+                self._active[i] = False
+                continue
+            if self._active[i] or (self._last_fired[i] is not None and now - self._last_fired[i] < self.cooldown):
+                continue
+            self._active[i] = True
+            self._last_fired[i] = now
+            alert = {"rule": rule.text, "value": value, "threshold": rule.threshold, "currency": snapshot.currency,
+                     "fetched_at": snapshot.fetched_at}
+            if chain is not None:
+                alert["trades"] = [x.current.to_data() for x in chain]
+            alerts.append(alert)
+        _metrics.increment("alert_rules_evaluated", len(indices))
+        _metrics.increment("alerts_fired", len(alerts))
+        return alerts
+
+    def _measure(self, rule, snapshot, chains):
+        """
+        :param chains: dict of the best chain from each tuple of start symbols, shared by the rules of one update.
+        :return: tuple of (the value the rule compares with its threshold, or None if it cannot be measured, and
+            the chain it was measured from, or None).
+        """
+        if rule.kind == "price":
+            return snapshot.price(rule.symbols[0]), None
+        if rule.kind == "ratio":
+            trade_pair = snapshot.trade_graph.pair(*rule.symbols)
+            trade = snapshot.active_trade_for_pair(trade_pair, 1) if trade_pair is not None else None
+            return (trade.ratio if trade is not None else None), None
+        if rule.kind == "value":
+            total = 0
+            for symbol in rule.symbols or self._quantities:
+                price = snapshot.price(symbol)
+                if price is None:
+                    return None, None
+                total += price * self._quantities.get(symbol, 0)
+            return total, None
+        start_symbols = rule.symbols or tuple(self._quantities)
+        if start_symbols not in chains:
+            search = TradeChainSearch(ExodusQuery.from_snapshot(snapshot), max_depth=self.depth, top_k=1,
+                                      node_budget=self.node_budget)
+            found = search.search(start_symbols=start_symbols, min_length=2)
+            chains[start_symbols] = found[0] if found else None
+        chain = chains[start_symbols]
+        return (chain[-1].chain_ratio if chain is not None else None), chain
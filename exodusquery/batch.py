@@ -0,0 +1,174 @@
+import json
+import os
+import sys
+
+from .chains import TradeChainSearch
+from .common import TradeDirection, _logger
+from .market import ExodusQuery
+
+
+def load_portfolios(path):
+    """
+    Read the portfolios to evaluate in a batch. `path` is either a directory of holdings files, named after the
+    portfolio they hold, or a JSONL file (`-` for stdin) with one portfolio per line, given either as a holdings
+    object or as `{"name": ..., "holdings": {...}}`. Portfolios which cannot be read are skipped with a warning.
+    :param path: str
+    :return: generator of (name, holdings) tuples, holdings being a list of (symbol, quantity) tuples.
+    """
+    if os.path.isdir(path):
+        for filename in sorted(os.listdir(path)):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(path, filename), "rt") as f_holdings:
+                    holdings = json.load(f_holdings)
+            except (IOError, ValueError) as e:
+                _logger.warning("skipping portfolio {}: {}".format(filename, e))
+                continue
+            if not isinstance(holdings, dict):
+                _logger.warning("skipping portfolio {}: holdings must be a JSON object".format(filename))
+                continue
+            yield os.path.splitext(filename)[0], list(holdings.items())
+        return
+
+    f_portfolios = sys.stdin if path == "-" else open(path, "rt")
+    try:
+        for line_number, line in enumerate(f_portfolios, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                _logger.warning("skipping portfolio on line {}: {}".format(line_number, e))
+                continue
+            if not isinstance(data, dict):
+                _logger.warning("skipping portfolio on line {}: holdings must be a JSON object".format(line_number))
+            elif isinstance(data.get("holdings"), dict):
+                yield str(data.get("name", line_number)), list(data["holdings"].items())
+            elif "holdings" in data:
+                _logger.warning("skipping portfolio on line {}: holdings must be a JSON object".format(line_number))
+            else:
+                yield str(line_number), list(data.items())
+    finally:
+        if f_portfolios is not sys.stdin:
+            f_portfolios.close()
+    return
+
+
+class PortfolioEvaluator(object):
+    """
+    Evaluates portfolios against one shared MarketSnapshot: the value of each holding in every currency of the
+    snapshot, its best outgoing trade and its available trades, and the profitable trades (or trade chains) from
+    the held symbols. The profitable trades of each symbol are only computed once, however many portfolios hold it.
+    """
+
+    def __init__(self, snapshot, symbols=None, count=5, direction=TradeDirection.DIR_BOTH, chains=False,
+                 depth=TradeChainSearch.DEFAULT_MAX_DEPTH, node_budget=TradeChainSearch.DEFAULT_NODE_BUDGET,
+                 min_ratio=1.0):
+        """
+        :param snapshot: MarketSnapshot, quoted in the currency the trades should be priced in.
+        :param symbols: optional list(str) of every symbol in the market (default: the symbols in its pairs).
+        :param count: int specifying the maximum number of available trades per holding, and of profitable trades
+            per portfolio (0 for all).
+        :param direction: TradeDirection flags selecting the available trades of each holding.
+        :param chains: bool, search for chains of profitable trades rather than single trades.
+        :param depth: int specifying the maximum number of trades in a chain.
+        :param node_budget: int specifying the maximum number of chain nodes to expand for each portfolio.
+        :param min_ratio: float which each profitable trade's ratio must exceed.
+        """
+        self.snapshot = snapshot
+        self.count = count
+        self.direction = direction
+        self.chains = chains
+        self.search = TradeChainSearch(ExodusQuery.from_snapshot(snapshot, symbols),
+                                       max_depth=depth if chains else 1, top_k=count, node_budget=node_budget,
+                                       min_ratio=min_ratio)
+
+    def evaluate(self, name, holdings):
+        """
+        :param name: str identifying the portfolio.
+        :param holdings: list of (symbol, quantity) tuples.
+        :return: dict() of results.
+        """
+        snapshot = self.snapshot
+        currencies = snapshot.currencies
+        totals = dict.fromkeys(currencies, 0)
+        unpriced = []
+        holding_results = []
+        top_trades = snapshot.get_available_trades_for_holdings(holdings, direction=TradeDirection.DIR_FRM, count=1)
+        available_trades = snapshot.get_available_trades_for_holdings(holdings, direction=self.direction,
+                                                                      count=self.count)
+        for symbol, quantity in holdings:
+            values = {}
+            for currency in currencies:
+                price = snapshot.price(symbol, currency)
+                values[currency] = price * quantity if price is not None else None
+                if values[currency] is not None:
+                    totals[currency] += values[currency]
+            if values[snapshot.currency] is None:
+                unpriced.append(symbol)
+            trades = available_trades.get(symbol, [])
+            holding_results.append({
+                "symbol": symbol,
+                "quantity": quantity,
+                "value": values,
+                "top_trade": top_trades[symbol][0].to_data() if top_trades.get(symbol) else None,
+                "available_trades": [x.to_data() for x in trades],
+            })
+
+        held_symbols = [x[0] for x in holdings]
+        chains = self.search.search(start_symbols=held_symbols, min_length=2 if self.chains else 1)
+        return {
+            "portfolio": name,
+            "fetched_at": snapshot.fetched_at,
+            "total": totals,
+            "unpriced": unpriced,
+            "holdings": holding_results,
+            "profitable_trades": [{"ratio": chain[-1].chain_ratio, "trades": [x.current.to_data() for x in chain]}
+                                  for chain in chains],
+            "search_truncated": self.search.truncated,
+        }
+
+
+_batch_evaluator = None
+
+
+def _init_batch_worker(evaluator):
+    global _batch_evaluator
+    _batch_evaluator = evaluator
+
+
+def _evaluate_in_batch_worker(portfolio):
+    return _batch_evaluator.evaluate(*portfolio)
+
+
+def evaluate_portfolios(evaluator, portfolios, workers=0):
+    """
+    Evaluate many portfolios against the evaluator's snapshot. With workers, the portfolios are spread over a pool
+    of processes which inherit the evaluator (and its snapshot) when forked, rather than each fetching the market.
+    Where processes cannot be forked, the portfolios are evaluated in this process.
+    :param evaluator: PortfolioEvaluator
+    :param portfolios: iterable of (name, holdings) tuples.
+    :param workers: int specifying the number of worker processes (0 or 1 evaluates in this process).
+    :return: generator of result dicts, in the order of `portfolios`.
+    """
+    if workers > 1:
+        import multiprocessing
+
+        if "fork" not in multiprocessing.get_all_start_methods():
+            _logger.warning("worker processes need the fork start method, evaluating portfolios in this process")
+            workers = 0
+    if workers <= 1:
+        for name, holdings in portfolios:
+            yield evaluator.evaluate(name, holdings)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    portfolios = list(portfolios)
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_batch_worker,
+                             initargs=(evaluator,)) as executor:
+        chunksize = max(1, len(portfolios) // (workers * 4))
+        for result in executor.map(_evaluate_in_batch_worker, portfolios, chunksize=chunksize):
+            yield result
+    return
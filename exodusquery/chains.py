@@ -0,0 +1,366 @@
+import heapq
+
+from .common import TradeDirection, _logger, _second_item
+from .metrics import _metrics
+
+
+class TradeChainNode(object):
+    """
+    One trade in a chain of trades. Each node knows the trade before it (`parent`), and the number of trades and
+    the compound ratio of the chain up to and including it, which are worked out once when the node is created.
+    """
+    __slots__ = ("current", "parent", "next", "length", "chain_ratio")
+
+    def __init__(self, trade_pair, parent=None):
+        """
+        :param trade_pair: ActiveTrade
+        :param parent: optional TradeChainNode of the previous trade in the chain.
+        """
+        self.current = trade_pair
+        self.parent = parent
+        self.next = []
+        if parent is None:
+            self.length = 1
+            self.chain_ratio = trade_pair.ratio
+        else:
+            self.length = parent.length + 1
+            self.chain_ratio = parent.chain_ratio * trade_pair.ratio
+
+    def get_chain_representation(self, indent=0):
+        return "{indent}{current}\n" \
+               "{children}".format(indent="\t"*indent, current=self,
+                                   children='\n'.join(["{indent}\t\t|---- {child} (chained_ratio:{chained_ratio})".format(
+                                       indent="\t"*indent, child=x, chained_ratio=x.chain_ratio) for x in self.next]))
+
+    def get_trade_chains(self):
+        """
+        :return: list of the chains from this node to each leaf below it (see iter_trade_chains).
+        """
+        return list(self.iter_trade_chains())
+
+    def iter_trade_chains(self):
+        """
+        Walk the tree below this node depth first, without recursion.
+        :return: generator of chains, each a new list of TradeChainNode objects from this node to a leaf.
+        """
+        chain = [self]
+        stack = [iter(self.next)]
+        if not self.next:
+            yield [self]
+            return
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                chain.pop()
+            elif child.next:
+                chain.append(child)
+                stack.append(iter(child.next))
+            else:
+                yield chain + [child]
+
+    def path(self):
+        """
+        :return: list of TradeChainNode objects from the root of the chain to this node.
+        """
+        chain = [None] * self.length
+        node = self
+        for i in range(self.length - 1, -1, -1):
+            chain[i] = node
+            node = node.parent
+        return chain
+
+    def __repr__(self):
+        return repr(self.current)
+
+
+class TradeChainSearch(object):
+    """
+    Bounded depth-first search for chains of profitable trades over the trade pair graph.
+
+    A chain never revisits a symbol, except for returning to the symbol it started from, which closes an
+    arbitrage cycle and terminates that chain. Branches that cannot beat the current top `top_k` results are
+    pruned, and the search stops once `node_budget` nodes have been expanded.
+
+    With `workers`, the subtrees below each first trade are searched by a pool of processes which inherit the
+    snapshot and the ranked trade lists when forked. Each process keeps its own top `top_k` and publishes the
+    lowest ratio in it to the others through shared memory for pruning, and the results are merged in the order a
+    single process would have found them, so the chains reported are the same. The node budget is shared out evenly
+    between the tasks. Where processes cannot be forked, the search runs in this process.
+    """
+    DEFAULT_MAX_DEPTH = 5
+    DEFAULT_NODE_BUDGET = 100000
+    TASKS_PER_WORKER = 4
+
+    def __init__(self, query, max_depth=DEFAULT_MAX_DEPTH, top_k=0, node_budget=DEFAULT_NODE_BUDGET, min_ratio=1.0,
+                 currency=None, workers=0):
+        """
+        :param query: ExodusQuery providing the symbols; its current snapshot provides the pairs and prices.
+        :param max_depth: int specifying the maximum number of trades in a chain.
+        :param top_k: int specifying the number of chains to keep (0 keeps all).
+        :param node_budget: int specifying the maximum number of nodes to expand (0 for unlimited).
+        :param min_ratio: float which each individual trade's ratio must exceed.
+        :param currency: optional str specifying one of the query's currencies to price trades in.
+        :param workers: int specifying the number of worker processes (0 or 1 searches in this process).
+        """
+        self.query = query
+        self.snapshot = query.snapshot if currency is None else query.snapshot.in_currency(currency)
+        self.max_depth = max_depth
+        self.top_k = top_k
+        self.node_budget = node_budget
+        self.min_ratio = min_ratio
+        self.workers = workers
+        self.nodes_expanded = 0
+        self.nodes_pruned = 0
+        self.cycles_found = 0
+        self.truncated = False
+        self._trades_from = {}
+        self._trades_between = {}
+        self._shared_threshold = None
+        self._best_trade_ratio = None
+        self._results = []
+        self._roots = []
+        self._sequence = 0
+
+    def trades_from(self, symbol):
+        """
+        Profitable outgoing trades for a single unit of `symbol`, best first. Computed once per search.
+        :param symbol: str
+        :return: list of ActiveTrade objects.
+        """
+        trades = self._trades_from.get(symbol)
+        if trades is None:
+            trades = self.snapshot.ranked_trades(symbol, 1, direction=TradeDirection.DIR_FRM,
+                                                 min_ratio=self.min_ratio)
+            self._trades_from[symbol] = trades
+        return trades
+
+    @property
+    def best_trade_ratio(self):
+        if self._best_trade_ratio is None:
+            best = self.min_ratio
+            for symbol in self.query.symbols:
+                trades = self.trades_from(symbol)
+                if trades:
+                    best = max(best, trades[0].ratio)
+            self._best_trade_ratio = best
+        return self._best_trade_ratio
+
+    def search(self, start_symbols=None, end_symbols=None, min_length=1, link_children=False):
+        """
+        Run the search and return the best chains found.
+        :param start_symbols: iterable of symbols to start chains from (default: ExodusQuery.symbols).
+        :param end_symbols: optional iterable of symbols a chain must finish on to be reported.
+        :param min_length: int specifying the minimum number of trades in a reported chain.
+        :param link_children: bool, populate TradeChainNode.next so the roots form a tree. Always searches in this
+            process.
+        :return: list of chains (lists of TradeChainNode from first to last trade), best chain_ratio first.
+        """
+        self._reset()
+        end_symbols = set(end_symbols) if end_symbols is not None else None
+        start_symbols = start_symbols if start_symbols is not None else self.query.symbols
+        with _metrics.timer("chain_search"):
+            if self.workers > 1 and not link_children and self._can_fork():
+                self._search_parallel(start_symbols, end_symbols, min_length)
+            else:
+                self._search_roots([(x, trade) for x in start_symbols for trade in self.trades_from(x)],
+                                   end_symbols, min_length, link_children)
+        _metrics.increment("chain_nodes_expanded", self.nodes_expanded)
+        _metrics.increment("chain_nodes_pruned", self.nodes_pruned)
+        _metrics.increment("chain_cycles_found", self.cycles_found)
+        if self.truncated:
+            _metrics.increment("chain_searches_truncated")
+        chains = [x[2] for x in sorted(self._results, reverse=True)]
+        return [x.path() for x in chains]
+
+    @property
+    def roots(self):
+        return self._roots
+
+    def _reset(self):
+        self.nodes_expanded = 0
+        self.nodes_pruned = 0
+        self.cycles_found = 0
+        self.truncated = False
+        self._results = []
+        self._roots = []
+        return
+
+    def _search_roots(self, roots, end_symbols, min_length, link_children=False):
+        for symbol, trade in roots:
+            if self._budget_exhausted():
+                break
+            node = TradeChainNode(trade)
+            if link_children:
+                self._roots.append(node)
+            self._expand(node, symbol, {symbol}, end_symbols, min_length, link_children)
+        return
+
+    def _can_fork(self):
+        import multiprocessing
+
+        if "fork" in multiprocessing.get_all_start_methods():
+            return True
+        _logger.warning("worker processes need the fork start method, searching trade chains in this process")
+        self.workers = 0
+        return False
+
+    def _search_parallel(self, start_symbols, end_symbols, min_length):
+        from concurrent.futures import ProcessPoolExecutor
+        import multiprocessing
+
+        roots = [(x, i) for x in start_symbols for i in range(len(self.trades_from(x)))]
+        if not roots:
+            return
+        # rank every symbol's trades before forking, so that the workers inherit them rather than each ranking them
+        self.best_trade_ratio
+        task_count = min(len(roots), self.workers * self.TASKS_PER_WORKER)
+        bounds = [len(roots) * i // task_count for i in range(task_count + 1)]
+        node_budget = -(-self.node_budget // task_count) if self.node_budget else 0
+        tasks = [(roots[bounds[i]:bounds[i + 1]], end_symbols, min_length, node_budget) for i in range(task_count)]
+        context = multiprocessing.get_context("fork")
+        self._shared_threshold = context.Value("d", 0.0, lock=False) if self.top_k else None
+        nodes = {}
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_chain_worker,
+                                 initargs=(self,)) as executor:
+            for results, expanded, pruned, cycles, truncated in executor.map(_search_in_chain_worker, tasks):
+                self.nodes_expanded += expanded
+                self.nodes_pruned += pruned
+                self.cycles_found += cycles
+                self.truncated = self.truncated or truncated
+                # each task's chains are numbered in the order it found them; renumber them in task order
+                for chain_ratio, _, symbols in sorted(results, key=_second_item, reverse=True):
+                    self._keep(chain_ratio, self._rebuild_chain(symbols, nodes))
+        self._shared_threshold = None
+        return
+
+    def _search_task(self, roots, end_symbols, min_length, node_budget):
+        """
+        Search the subtrees below some of the first trades, as a task of a parallel search.
+        :param roots: list of (symbol, int) tuples identifying first trades by their index in trades_from(symbol).
+        :param end_symbols: optional set of symbols a chain must finish on to be reported.
+        :param min_length: int specifying the minimum number of trades in a reported chain.
+        :param node_budget: int specifying the maximum number of nodes to expand for this task (0 for unlimited).
+        :return: tuple of (list of (chain_ratio, sequence, symbols), nodes expanded, nodes pruned, cycles found,
+            truncated), where symbols is the tuple of symbols the chain passes through.
+        """
+        self._reset()
+        self.node_budget = node_budget
+        self._search_roots([(x, self.trades_from(x)[i]) for x, i in roots], end_symbols, min_length)
+        results = []
+        for chain_ratio, sequence, node in self._results:
+            path = node.path()
+            symbols = (path[0].current.trade_pair.left.symbol,) + tuple(x.current.trade_pair.right.symbol
+                                                                         for x in path)
+            results.append((chain_ratio, sequence, symbols))
+        return results, self.nodes_expanded, self.nodes_pruned, self.cycles_found, self.truncated
+
+    def _rebuild_chain(self, symbols, nodes):
+        """
+        :param symbols: tuple of the symbols a chain passes through.
+        :param nodes: dict of symbols to the nodes already rebuilt, so that chains share their common prefixes.
+        :return: the last TradeChainNode of the chain.
+        """
+        node = nodes.get(symbols)
+        if node is None:
+            left_symbol = symbols[-2]
+            trades = self._trades_between.get(left_symbol)
+            if trades is None:
+                trades = {x.trade_pair.right.symbol: x for x in self.trades_from(left_symbol)}
+                self._trades_between[left_symbol] = trades
+            parent = self._rebuild_chain(symbols[:-1], nodes) if len(symbols) > 2 else None
+            node = TradeChainNode(trades[symbols[-1]], parent)
+            nodes[symbols] = node
+        return node
+
+    def _budget_exhausted(self):
+        if self.node_budget and self.nodes_expanded >= self.node_budget:
+            self.truncated = True
+            return True
+        return False
+
+    def _expand(self, node, origin, visited, end_symbols, min_length, link_children):
+        self.nodes_expanded += 1
+        symbol = node.current.trade_pair.right.symbol
+        length = node.length
+        extended = False
+        if symbol == origin:
+            self.cycles_found += 1
+        elif length < self.max_depth:
+            visited.add(symbol)
+            for trade in self.trades_from(symbol):
+                next_symbol = trade.trade_pair.right.symbol
+                if next_symbol in visited and next_symbol != origin:
+                    continue
+                if self._cannot_improve(node.chain_ratio * trade.ratio, length + 1):
+                    # the chain continues, just not into anything worth reporting, so it is not a leaf either
+                    extended = True
+                    self.nodes_pruned += 1
+                    continue
+                if self._budget_exhausted():
+                    break
+                child = TradeChainNode(trade, node)
+                if link_children:
+                    node.next.append(child)
+                extended = True
+                self._expand(child, origin, visited, end_symbols, min_length, link_children)
+            visited.discard(symbol)
+        if not extended:
+            self._record(node, symbol, end_symbols, min_length)
+
+    def _cannot_improve(self, chain_ratio, length):
+        if not self.top_k:
+            return False
+        # a chain may stop at any length, so further trades can never lower its bound
+        upper_bound = chain_ratio * max(self.best_trade_ratio, 1.0) ** (self.max_depth - length)
+        # another worker's chains only beat ours on ties if they were found earlier, so only prune below theirs
+        if self._shared_threshold is not None and upper_bound < self._shared_threshold.value:
+            return True
+        return len(self._results) >= self.top_k and upper_bound <= self._results[0][0]
+
+    def _record(self, node, symbol, end_symbols, min_length):
+        if node.length < min_length:
+            return
+        if end_symbols is not None and symbol not in end_symbols:
+            return
+        self._keep(node.chain_ratio, node)
+
+    def _keep(self, chain_ratio, node):
+        self._sequence += 1
+        entry = (chain_ratio, -self._sequence, node)
+        if not self.top_k:
+            self._results.append(entry)
+        elif len(self._results) < self.top_k:
+            heapq.heappush(self._results, entry)
+        elif chain_ratio > self._results[0][0]:
+            heapq.heapreplace(self._results, entry)
+        if self._shared_threshold is not None and len(self._results) == self.top_k and \
+                self._results[0][0] > self._shared_threshold.value:
+            self._shared_threshold.value = self._results[0][0]
+
+
+_chain_search = None
+
+
+def _init_chain_worker(search):
+    global _chain_search
+    _chain_search = search
+
+
+def _search_in_chain_worker(task):
+    return _chain_search._search_task(*task)
+
+
+def produce_chain_tree(query, depth=TradeChainSearch.DEFAULT_MAX_DEPTH,
+                       node_budget=TradeChainSearch.DEFAULT_NODE_BUDGET):
+    """
+    Build the tree of profitable trade chains starting from every known symbol.
+    :param query: ExodusQuery
+    :param depth: int specifying the maximum number of trades in a chain.
+    :param node_budget: int specifying the maximum number of nodes to expand.
+    :return: list of root TradeChainNode objects.
+    """
+    search = TradeChainSearch(query, max_depth=depth, node_budget=node_budget)
+    search.search(link_children=True)
+    return search.roots
+
@@ -0,0 +1,757 @@
+from time import monotonic, sleep
+import argparse
+import heapq
+import json
+import os
+
+from .client import CacheMissError, ExodusClient, ExodusRoutes, RateLimitedError, ResponseCache
+from .common import DEFAULT_JITTER, DEFAULT_PAIRS_INTERVAL, DEFAULT_PRICES_INTERVAL, TradeDirection, _logger
+from .daemon import DaemonClient, QueryDaemon, default_daemon_address
+from .market import ExodusQuery, TopTradeTracker
+from .metrics import PrometheusExporter, StatsdExporter, _metrics
+from .render import OUTPUT_SINKS, WebhookSink, display_trade_table, open_sink
+
+
+def uses_daemon(args):
+    """
+    :return: bool, whether the action should be sent to a running daemon before being run here.
+    """
+    return not args.no_daemon and getattr(args, "daemon_capable", True) and not is_watching(args) and \
+        not (args.record or args.offline or args.no_cache or args.profile_output or args.metrics_port or args.statsd)
+
+
+def handle_generic_query(query):
+    return
+
+
+def handle_holding_query(query, holdings):
+    return
+
+
+class QueryHandlerGeneric:
+
+    @staticmethod
+    def handle_query_generic_available_trades(query, holdings, args):
+        """
+        Display a table of all trades currently available on the Exodus exchange.
+        :param query:
+        :param holdings:
+        :param args:
+        :return:
+        """
+        query_symbols = [args.symbol.upper()] if args.symbol else query.symbols
+        snapshot = quoted_snapshot(query.snapshot, args)
+        rate_matrix = snapshot.rate_matrix
+        if rate_matrix is not None:
+            ranked = rate_matrix.rank_pairs(from_symbols=query_symbols, profitable=args.profitable,
+                                            top_only=args.top_only, count=args.count)
+            top_trades = (snapshot.active_trade_for_pair(rate_matrix.pairs[i], 1) for i in ranked)
+            display_trade_table({"": top_trades}, max_lines=args.count, sink=args.sink)
+            return
+
+        # the best `count` trades overall are among the best `count` of each symbol
+        dummy_holdings = [(x, 1) for x in query_symbols]
+        available_trades_for_holdings = snapshot.get_available_trades_for_holdings(
+            dummy_holdings, direction=TradeDirection.DIR_FRM, count=1 if args.top_only else args.count)
+        top_trades = [trade for trades in available_trades_for_holdings.values() for trade in trades
+                      if not args.profitable or trade.is_profitable_trade]
+        if args.count and args.count < len(top_trades):
+            top_trades = heapq.nlargest(args.count, top_trades, key=lambda x: x.ratio)
+        else:
+            top_trades.sort(key=lambda x: x.ratio, reverse=True)
+        display_trade_table({"": top_trades}, max_lines=args.count, sink=args.sink)
+        return
+
+    @staticmethod
+    def handle_query_generic_show_currencies(query, holdings, args):
+        """
+        Display a full list of currencies, with their associated prices.
+        :param query:
+        :param holdings:
+        :param args:
+        :return:
+        """
+        currencies = quoted_currencies(query, args)
+        snapshot = query.snapshot
+        price_list = snapshot.price_list(currencies[0])
+        price_list.sort(key=lambda x: x[1], reverse=args.reverse)
+        for i, (symbol, price) in enumerate(price_list):
+            if args.count and i >= args.count:
+                break
+            record = {"symbol": symbol, currencies[0]: price}
+            record.update((x, snapshot.price(symbol, x)) for x in currencies[1:])
+            args.sink.write(record, layout="price")
+        return
+
+
+class QueryHandlerHolding:
+
+    @staticmethod
+    def handle_query_holding_value(query, holdings, args):
+        """
+        Display the sum total of specified holdings at current value according to the Exodus pricing API.
+        :param query:
+        :param holdings:
+        :param args:
+        :return:
+        """
+        currencies = quoted_currencies(query, args)
+        snapshot = query.snapshot
+        totals = [0] * len(currencies)
+        for symbol, quantity in holdings:
+            values = [snapshot.price_from_symbol(symbol, x) * quantity for x in currencies]
+            totals = [total + value for total, value in zip(totals, values)]
+            record = {"symbol": symbol, "quantity": quantity}
+            record.update(zip(currencies, values))
+            args.sink.write(record, layout="value")
+        record = {"symbol": "TOTAL", "quantity": None}
+        record.update(zip(currencies, totals))
+        args.sink.write(record, layout="value")
+        return
+
+    @staticmethod
+    def handle_query_holding_top_trades(query, holdings, args):
+        """
+        Display information on the least-expensive (most-profitable) trades available on the Exodus exchange
+        :param query:
+        :param holdings:
+        :param args:
+        :return:
+        """
+        tracker = TopTradeTracker(holdings)
+
+        def on_snapshot(snapshot):
+            changed = tracker.update(quoted_snapshot(snapshot, args))
+            changed_trades = {symbol: [trade] for symbol, trade in changed.items() if trade is not None}
+            if changed_trades:
+                display_trade_table(changed_trades, max_lines=1, no_header=True, sink=args.sink)
+                args.sink.end_group()
+
+        if is_watching(args):
+            scheduler_from_args(query, args).run(on_snapshot)
+        else:
+            on_snapshot(query.snapshot)
+        return
+
+    @staticmethod
+    def handle_query_holding_available_trades(query, holdings, args):
+        """
+        Display information on available trades linked to the specified holdings.
+        :param query:
+        :param holdings:
+        :param args:
+        :return:
+        """
+        direction = (TradeDirection.DIR_FRM if args.trades_from else 0) | (TradeDirection.DIR_TO if args.trades_to else 0)
+        snapshot = quoted_snapshot(query.snapshot, args)
+        available_trades_for_holdings = snapshot.get_available_trades_for_holdings(holdings, direction=direction,
+                                                                                   count=args.count)
+        display_trade_table(available_trades_for_holdings, max_lines=args.count, sink=args.sink)
+        return
+
+    @staticmethod
+    def handle_query_holding_profitable_trades(query, holdings, args):
+        """
+        Display information on trades where the resulting value of the destination currency outweighs the value
+        of the held currency.
+        :param query:
+        :param holdings:
+        :param args:
+        :return:
+        """
+        from .chains import TradeChainSearch
+
+        direction = (TradeDirection.DIR_FRM if args.trades_from else 0) | (TradeDirection.DIR_TO if args.trades_to else 0)
+        held_symbols = [x[0] for x in holdings]
+
+        _logger.info("searching for profitable trades ({})".format("COMPOUND" if args.allow_trade_chains else "SINGLE"))
+        search = TradeChainSearch(query,
+                                  max_depth=args.depth if args.allow_trade_chains else 1,
+                                  top_k=args.count,
+                                  node_budget=args.node_budget,
+                                  min_ratio=args.min_ratio,
+                                  currency=args.quote,
+                                  workers=args.workers)
+        chains = search.search(start_symbols=held_symbols if direction & TradeDirection.DIR_FRM else None,
+                               end_symbols=held_symbols if direction & TradeDirection.DIR_TO else None,
+                               min_length=2 if args.allow_trade_chains else 1)
+        _logger.debug("chain search expanded {} nodes, pruned {}, found {} cycles{}".format(
+            search.nodes_expanded, search.nodes_pruned, search.cycles_found,
+            " (node budget exhausted)" if search.truncated else ""))
+        if search.truncated:
+            _logger.warning("node budget of {} exhausted, results may be incomplete".format(search.node_budget))
+        if len(chains):
+            if not args.allow_trade_chains:
+                # If not showing compounding chains, collate all rows and present together
+                display_trade_table({"": (chain[0].current for chain in chains)}, max_lines=args.count,
+                                    sink=args.sink)
+            else:
+                # otherwise, present the chains as separate tables
+                for i, compound_chain in enumerate(chains):
+                    for step, node in enumerate(compound_chain):
+                        record = {"chain": i, "chain_ratio": compound_chain[-1].chain_ratio, "step": step}
+                        record.update(node.current.to_data())
+                        args.sink.write(record, layout="chain_step")
+        else:
+            _logger.info("no profitable trades available at this time.")
+        return
+
+
+    @staticmethod
+    def handle_query_holding_alerts(query, holdings, args):
+        """
+        Report each time one of the rules in a file becomes true, evaluating each rule only when the prices or
+        pairs it depends on change.
+        :param query:
+        :param holdings:
+        :param args:
+        :return:
+        """
+        from .alerts import AlertEngine, load_alert_rules
+
+        try:
+            rules = load_alert_rules(args.rules)
+        except (IOError, ValueError) as e:
+            _logger.error("Failed to load alert rules: {}".format(e))
+            return
+        engine = AlertEngine(rules, holdings, cooldown=args.cooldown, depth=args.depth, node_budget=args.node_budget)
+        if not args.replay:
+            # some rules may name symbols which take part in no pair, so their prices were not fetched with the rest
+            query.ensure_prices(engine.symbols)
+        webhook = WebhookSink(args.webhook, timeout=args.timeout) if args.webhook else None
+
+        def on_snapshot(snapshot):
+            for alert in engine.update(quoted_snapshot(snapshot, args)):
+                args.sink.write(alert, layout="alert")
+                if webhook is not None:
+                    webhook.write(alert)
+            args.sink.flush()
+
+        try:
+            if is_watching(args):
+                scheduler_from_args(query, args).run(on_snapshot)
+            else:
+                on_snapshot(query.snapshot)
+        finally:
+            if webhook is not None:
+                webhook.close()
+        return
+
+
+class QueryHandlerBatch:
+
+    @staticmethod
+    def handle_query_batch_evaluate(query, holdings, args):
+        """
+        Evaluate every portfolio in a directory or JSONL file against the same market snapshot, and write one
+        result per portfolio to the output sink.
+        :param query:
+        :param holdings:
+        :param args:
+        :return:
+        """
+        from .batch import PortfolioEvaluator, evaluate_portfolios, load_portfolios
+
+        direction = (TradeDirection.DIR_FRM if args.trades_from else 0) | (TradeDirection.DIR_TO if args.trades_to else 0)
+        portfolios = list(load_portfolios(args.portfolios))
+        held_symbols = set(symbol for _, portfolio in portfolios for symbol, _ in portfolio)
+        if not args.replay:
+            # some holdings may take part in no pair, so their prices were not fetched with the rest
+            query.ensure_prices(held_symbols)
+        evaluator = PortfolioEvaluator(quoted_snapshot(query.snapshot, args), symbols=query.symbols,
+                                       count=args.count, direction=direction or TradeDirection.DIR_BOTH,
+                                       chains=args.allow_trade_chains, depth=args.depth,
+                                       node_budget=args.node_budget, min_ratio=args.min_ratio)
+        started = monotonic()
+        evaluated = 0
+        for result in evaluate_portfolios(evaluator, portfolios, workers=args.workers):
+            args.sink.write(result)
+            evaluated += 1
+        args.sink.flush()
+        _logger.info("evaluated {} portfolios in {:.2f}s".format(evaluated, monotonic() - started))
+        return
+
+
+class QueryHandlerDaemon:
+
+    @staticmethod
+    def handle_query_daemon_serve(query, holdings, args):
+        """
+        Keep the market refreshed in the background, and answer the generic and holding actions of other
+        invocations from it until interrupted.
+        :param query:
+        :param holdings:
+        :param args:
+        :return:
+        """
+        import threading
+
+        try:
+            daemon = QueryDaemon(query, args.daemon_address).start()
+        except OSError as e:
+            _logger.error("Failed to start daemon: {}".format(e))
+            return
+        scheduler = scheduler_from_args(query, args)
+
+        def keep_refreshing():
+            while True:
+                try:
+                    scheduler.run(lambda snapshot: None)
+                    return
+                except Exception:
+                    # without a refresher the daemon would answer from a stale snapshot until it is restarted
+                    _logger.exception("daemon refresh failed, restarting it")
+                    sleep(scheduler.prices_interval)
+
+        refresher = threading.Thread(target=keep_refreshing, name="daemon-refresh", daemon=True)
+        refresher.start()
+        try:
+            daemon.serve_forever()
+        finally:
+            daemon.close()
+        return
+
+
+def main(argv):
+    args = parse_arguments(argv)
+    if not hasattr(args, "handler"):
+        _logger.warning("no action defined. See --help")
+        return
+
+    holdings = list()
+    if getattr(args, "requires_holdings", True):
+        try:
+            with open(args.holdings, 'rt') as f_holdings:
+                for symbol, quantity in json.load(f_holdings).items():
+                    holdings.append((symbol, quantity))
+        except Exception as e:
+            _logger.error("Failed to load holdings from file")
+            return
+
+    currencies = parse_currencies(args)
+    output_format = args.format or getattr(args, "default_format", "table")
+    if output_format == "table" and not getattr(args, "renders_table", True):
+        _logger.error("--format table is not supported by this action")
+        return
+    response = DaemonClient(args.daemon_address, timeout=args.timeout).query(argv, holdings) \
+        if uses_daemon(args) else None
+
+    if args.replay:
+        from .replay import ReplayClient
+
+        try:
+            client = ReplayClient(args.replay, start=args.replay_from, end=args.replay_to)
+        except IOError as e:
+            _logger.error("Failed to open replay log: {}".format(e))
+            return
+    elif response is None:
+        cache = None
+        if not args.no_cache:
+            cache = ResponseCache(os.path.join(args.cache_dir, ResponseCache.FILENAME))
+        client = ExodusClient(router=ExodusRoutes(args.pricing_url, args.exchange_url), timeout=args.timeout,
+                              retries=args.retries, cache=cache, offline=args.offline)
+        if args.max_age is not None:
+            client.pairs_ttl = client.prices_ttl = args.max_age
+    try:
+        args.sink = open_sink(output_format, args.output)
+    except (IOError, ImportError) as e:
+        _logger.error("Failed to open {} output: {}".format(output_format, e))
+        return
+    if response is not None:
+        try:
+            write_daemon_response(response, args.sink)
+        finally:
+            args.sink.close()
+        return
+    try:
+        exporters = start_exporters(args)
+    except (OSError, ValueError) as e:
+        _logger.error("Failed to start metrics exporter: {}".format(e))
+        args.sink.close()
+        return
+    profiler = None
+    if args.profile_output:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def run_handler(snapshot=None):
+        args.handler(query=query, holdings=holdings, args=args)
+        args.sink.flush()
+
+    recorder = None
+    if args.record:
+        from .replay import SnapshotRecorder
+
+        recorder = SnapshotRecorder(args.record)
+    try:
+        held_symbols = [x[0] for x in holdings]
+        with ExodusQuery(currencies[0], client=client, with_pairs=getattr(args, "requires_pairs", True),
+                         recorder=recorder, currencies=currencies, holding_symbols=held_symbols,
+                         symbols=held_symbols if getattr(args, "prices_holdings_only", False) else None) as query:
+            if is_watching(args) and not getattr(args, "handles_watch", False):
+                scheduler_from_args(query, args).run(run_handler)
+            else:
+                run_handler()
+    except CacheMissError as e:
+        _logger.error("{} (offline mode)".format(e))
+    except RateLimitedError as e:
+        _logger.error("{}, try again later".format(e))
+    except (EOFError, ValueError) as e:
+        if not args.replay:
+            raise
+        _logger.error("Failed to replay: {}".format(e))
+    finally:
+        args.sink.close()
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile_output)
+            _logger.info("wrote profile to {}".format(args.profile_output))
+        if args.profile:
+            _logger.info("profile summary:")
+            for line in _metrics.summary():
+                _logger.info("  " + line)
+        for exporter in exporters:
+            exporter.close()
+    return
+
+
+def start_exporters(args):
+    """
+    :return: list of the started metrics exporters requested by `args`.
+    """
+    exporters = []
+    try:
+        if args.metrics_port is not None:
+            exporters.append(PrometheusExporter(_metrics, args.metrics_port).start())
+        if args.statsd:
+            exporters.append(StatsdExporter(_metrics, args.statsd).start())
+    except (OSError, ValueError):
+        for exporter in exporters:
+            exporter.close()
+        raise
+    return exporters
+
+
+def parse_currencies(args):
+    """
+    :return: list(str) of the currencies to fetch prices in, the default first, including any quote currency.
+    """
+    currencies = [x.strip().upper() for x in args.currency.split(",") if x.strip()]
+    if getattr(args, "quote", None):
+        args.quote = args.quote.upper()
+        if args.quote not in currencies:
+            currencies.append(args.quote)
+    return currencies
+
+
+def write_daemon_response(response, sink):
+    """
+    Output what an action run by the daemon logged and wrote, as though it had run here.
+    """
+    for level, message in response["log"]:
+        _logger.log(level, message)
+    for record in response["records"]:
+        sink.write(record)
+    return
+
+
+def quoted_currencies(query, args):
+    return [args.quote] if args.quote else query.currencies
+
+
+def quoted_snapshot(snapshot, args):
+    return snapshot.in_currency(args.quote) if args.quote else snapshot
+
+
+def is_watching(args):
+    return args.watch_all or bool(args.replay) or getattr(args, "watch", False)
+
+
+def scheduler_from_args(query, args):
+    if args.replay:
+        from .replay import SnapshotReplayer
+
+        return SnapshotReplayer(query, speed=args.replay_speed)
+    from .watch import PollingScheduler
+
+    return PollingScheduler(query, prices_interval=args.interval, pairs_interval=args.pairs_interval,
+                            jitter=args.jitter)
+
+
+def positive_float(value):
+    """
+    argparse type for intervals, which must be positive.
+    """
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError("must be greater than 0, not {}".format(value))
+    return number
+
+
+def parse_arguments(argv):
+    """
+    Parse the command line in two passes. The first only finds the context and action selected, so that the second
+    adds the arguments of that action alone, and only imports the modules they need.
+    :param argv: list(str) of command line arguments.
+    :return: argparse.Namespace
+    """
+    try:
+        selected, _ = build_parser(parser_class=_SelectionParser).parse_known_args(argv)
+    except argparse.ArgumentError:
+        # Leave reporting the error to the full parser.
+        selected = argparse.Namespace()
+    return build_parser(getattr(selected, "context", None), getattr(selected, "action", None)).parse_args(argv)
+
+
+class _SelectionParser(argparse.ArgumentParser):
+    """
+    Parser for the first pass of parse_arguments, which leaves both help and errors to the second.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs["add_help"] = False
+        super(_SelectionParser, self).__init__(*args, **kwargs)
+
+    def error(self, message):
+        raise argparse.ArgumentError(None, message)
+
+
+def build_parser(context=None, action=None, parser_class=argparse.ArgumentParser):
+    """
+    :param context: optional str naming the selected context, whose arguments are added.
+    :param action: optional str naming the selected action of `context`, whose arguments are added.
+    :param parser_class: class of the parsers to build.
+    :return: argparse.ArgumentParser, listing every context and action.
+    """
+    parser = parser_class()
+
+    parser.add_argument("--currency", default="GBP",
+                        help="Specify the currency to operate in, or a comma-separated list of currencies to fetch "
+                             "prices in together, the first being the default (default:GBP)")
+    parser.add_argument("--format", choices=["table"] + sorted(OUTPUT_SINKS),
+                        help="Specify the output format (default:table, or jsonl for batch)")
+    parser.add_argument("--output", default="-",
+                        help="Specify the file to write jsonl, csv, arrow or parquet output to (default:- (stdout))")
+    parser.add_argument("--holdings", default="holdings.json", help="Specify the path to your holdings.json file (default:holdings.json)")
+    parser.add_argument("--pricing-url",
+                        help="Specify the base URL of the pricing API (default:{})".format(ExodusRoutes.__PRICING__))
+    parser.add_argument("--exchange-url",
+                        help="Specify the base URL of the exchange API (default:{})".format(ExodusRoutes.__EXCHANGE__))
+    parser.add_argument("--timeout", type=float, default=ExodusClient.DEFAULT_TIMEOUT,
+                        help="Specify the timeout in seconds for each API request (default:{})".format(
+                            ExodusClient.DEFAULT_TIMEOUT))
+    parser.add_argument("--retries", type=int, default=ExodusClient.DEFAULT_RETRIES,
+                        help="Specify the number of times to retry a failed API request (default:{})".format(
+                            ExodusClient.DEFAULT_RETRIES))
+    parser.add_argument("--cache-dir", default=ResponseCache.default_directory(),
+                        help="Specify the directory to cache API responses in (default:{})".format(
+                            ResponseCache.default_directory()))
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Neither read nor write cached API responses")
+    parser.add_argument("--max-age", type=float,
+                        help="Specify the maximum age in seconds of cached responses to reuse (default:{}s for "
+                             "pairs, {}s for prices)".format(ExodusClient.DEFAULT_PAIRS_TTL,
+                                                             ExodusClient.DEFAULT_PRICES_TTL))
+    parser.add_argument("--offline", action="store_true",
+                        help="Only use cached API responses, regardless of their age")
+    parser.add_argument("--record", metavar="PATH",
+                        help="Append every refreshed snapshot of the market to the log at PATH")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="Run the selected action against each snapshot recorded in the log at PATH instead of "
+                             "querying the API")
+    parser.add_argument("--replay-speed", type=float, default=0,
+                        help="Specify the replay speed as a multiple of real time (default:0 (as fast as possible))")
+    parser.add_argument("--replay-from", type=float, metavar="TIMESTAMP",
+                        help="Only replay snapshots recorded at or after this UNIX timestamp")
+    parser.add_argument("--replay-to", type=float, metavar="TIMESTAMP",
+                        help="Only replay snapshots recorded before this UNIX timestamp")
+    parser.add_argument("--watch", dest="watch_all", action="store_true",
+                        help="Repeat the selected action every time the prices are refreshed")
+    parser.add_argument("--interval", type=positive_float, default=DEFAULT_PRICES_INTERVAL,
+                        help="Specify the number of seconds between price refreshes in watch mode (default:{})".format(
+                            DEFAULT_PRICES_INTERVAL))
+    parser.add_argument("--pairs-interval", type=positive_float, default=DEFAULT_PAIRS_INTERVAL,
+                        help="Specify the number of seconds between trade pair refreshes in watch mode "
+                             "(default:{})".format(DEFAULT_PAIRS_INTERVAL))
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER,
+                        help="Specify the fraction of the interval to randomly delay each refresh by "
+                             "(default:{})".format(DEFAULT_JITTER))
+
+    parser.add_argument("--daemon-address", default=default_daemon_address(), metavar="ADDRESS",
+                        help="Specify the Unix socket path or HOST:PORT the daemon serves queries on "
+                             "(default:{})".format(default_daemon_address()))
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="Run the action here even if a daemon is running")
+    parser.add_argument("--profile", action="store_true",
+                        help="Log a summary of the timers and counters on exit")
+    parser.add_argument("--profile-output", metavar="PATH",
+                        help="Run under cProfile and write the statistics to PATH, for reading with pstats")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="Serve metrics in the Prometheus text format at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--statsd", metavar="HOST:PORT",
+                        help="Push metrics to the StatsD server at HOST:PORT")
+
+    context_parser_group = parser.add_subparsers(title="context")
+    generic_parser = context_parser_group.add_parser("generic")
+    generic_parser.set_defaults(handler=handle_generic_query, context="generic")
+    generic_parser_group = generic_parser.add_subparsers(title="action")
+
+    generic_available_trades_parer = generic_parser_group.add_parser("available-trades")
+    generic_available_trades_parer.set_defaults(handler=QueryHandlerGeneric.handle_query_generic_available_trades,
+                                                action="available-trades")
+    if (context, action) == ("generic", "available-trades"):
+        generic_available_trades_parer.add_argument("-c", "--count", type=int, default=0,
+                                                    help="specify maximum number of rows to show per currency "
+                                                         "(default:0 (all))")
+        generic_available_trades_parer.add_argument("-s", "--symbol",
+                                                    help="specify a symbol to show trades for")
+        generic_available_trades_parer.add_argument("-t", "--top-only", action="store_true",
+                                                    help="only show the most profitable trade for each symbol")
+        generic_available_trades_parer.add_argument("-p", "--profitable", action="store_true",
+                                                    help="only show profitable trades")
+        generic_available_trades_parer.add_argument("-q", "--quote", metavar="CURRENCY",
+                                                    help="price the trades in this currency (default:the first "
+                                                         "--currency)")
+
+    generic_prices_parser = generic_parser_group.add_parser("prices")
+    generic_prices_parser.set_defaults(handler=QueryHandlerGeneric.handle_query_generic_show_currencies,
+                                       requires_pairs=False, action="prices")
+    if (context, action) == ("generic", "prices"):
+        generic_prices_parser.add_argument("-c", "--count", type=int, default=0,
+                                           help="specify maximum number of rows to show per currency "
+                                                "(default:0 (all))")
+        generic_prices_parser.add_argument("-r", "--reverse", action="store_true",
+                                           help="reverse the sorting of the price list (high_to_low)")
+        generic_prices_parser.add_argument("-q", "--quote", metavar="CURRENCY",
+                                           help="only show prices in this currency (default:every --currency)")
+
+    holding_parser = context_parser_group.add_parser("holding")
+    holding_parser.set_defaults(handler=handle_holding_query, context="holding")
+    holding_parser_group = holding_parser.add_subparsers(title="action")
+
+    holding_value_parser = holding_parser_group.add_parser("value")
+    holding_value_parser.set_defaults(handler=QueryHandlerHolding.handle_query_holding_value, requires_pairs=False,
+                                      prices_holdings_only=True, action="value")
+    if (context, action) == ("holding", "value"):
+        holding_value_parser.add_argument("-q", "--quote", metavar="CURRENCY",
+                                          help="only show values in this currency (default:every --currency)")
+
+    holding_value_parser = holding_parser_group.add_parser("top-trades")
+    holding_value_parser.set_defaults(handler=QueryHandlerHolding.handle_query_holding_top_trades, handles_watch=True,
+                                      action="top-trades")
+    if (context, action) == ("holding", "top-trades"):
+        holding_value_parser.add_argument("--watch", action="store_true",
+                                          help="Continuously retrieve the best outgoing trades for all held "
+                                               "currencies.")
+        holding_value_parser.add_argument("-q", "--quote", metavar="CURRENCY",
+                                          help="price the trades in this currency (default:the first --currency)")
+
+    holding_available_trades_parser = holding_parser_group.add_parser('available-trades')
+    holding_available_trades_parser.set_defaults(handler=QueryHandlerHolding.handle_query_holding_available_trades,
+                                                 action="available-trades")
+    if (context, action) == ("holding", "available-trades"):
+        holding_available_trades_parser.add_argument("-c", "--count", type=int, default=0,
+                                                     help="specify maximum number of rows to show per currency "
+                                                          "(default:0 (all))")
+        holding_available_trades_parser.add_argument("--trades-from", action="store_true",
+                                                     help="show trades from held currencies")
+        holding_available_trades_parser.add_argument("--trades-to", action="store_true",
+                                                     help="show trades to held currencies")
+        holding_available_trades_parser.add_argument("-q", "--quote", metavar="CURRENCY",
+                                                     help="price the trades in this currency (default:the first "
+                                                          "--currency)")
+
+    holding_profitable_trades_parser = holding_parser_group.add_parser('profitable-trades')
+    holding_profitable_trades_parser.set_defaults(handler=QueryHandlerHolding.handle_query_holding_profitable_trades,
+                                                  action="profitable-trades")
+    if (context, action) == ("holding", "profitable-trades"):
+        from .chains import TradeChainSearch
+
+        holding_profitable_trades_parser.add_argument("-c", "--count", type=int, default=0,
+                                                      help="specify maximum number of rows to show (default:0 (all))")
+        holding_profitable_trades_parser.add_argument("--trades-from", action="store_true",
+                                                      help="show trades from held currencies")
+        holding_profitable_trades_parser.add_argument("--trades-to", action="store_true",
+                                                      help="show trades to held currencies")
+        holding_profitable_trades_parser.add_argument("--allow-trade-chains", action="store_true",
+                                                      help="include chain-trading results")
+        holding_profitable_trades_parser.add_argument("--min-ratio", type=float, default=1.0,
+                                                      help="ratio each trade must exceed to be considered profitable "
+                                                           "(default:1.0)")
+        holding_profitable_trades_parser.add_argument("--depth", type=int,
+                                                      default=TradeChainSearch.DEFAULT_MAX_DEPTH,
+                                                      help="maximum number of trades in a chain (default:{})".format(
+                                                          TradeChainSearch.DEFAULT_MAX_DEPTH))
+        holding_profitable_trades_parser.add_argument("--node-budget", type=int,
+                                                      default=TradeChainSearch.DEFAULT_NODE_BUDGET,
+                                                      help="maximum number of chain nodes to expand "
+                                                           "(default:{})".format(TradeChainSearch.DEFAULT_NODE_BUDGET))
+        holding_profitable_trades_parser.add_argument("-w", "--workers", type=int, default=1,
+                                                      help="number of worker processes to search chains with "
+                                                           "(default:1)")
+        holding_profitable_trades_parser.add_argument("-q", "--quote", metavar="CURRENCY",
+                                                      help="price the trades in this currency (default:the first "
+                                                           "--currency)")
+
+    holding_alerts_parser = holding_parser_group.add_parser("alerts")
+    holding_alerts_parser.set_defaults(handler=QueryHandlerHolding.handle_query_holding_alerts, handles_watch=True,
+                                       daemon_capable=False, action="alerts")
+    if (context, action) == ("holding", "alerts"):
+        from .alerts import AlertEngine
+        from .chains import TradeChainSearch
+
+        holding_alerts_parser.add_argument("rules", metavar="RULES",
+                                           help="file of alert rules, one per line")
+        holding_alerts_parser.add_argument("--watch", action="store_true",
+                                           help="Continuously evaluate the rules as the market is refreshed.")
+        holding_alerts_parser.add_argument("--cooldown", type=float, default=AlertEngine.DEFAULT_COOLDOWN,
+                                           help="minimum number of seconds between alerts from the same rule "
+                                                "(default:{})".format(AlertEngine.DEFAULT_COOLDOWN))
+        holding_alerts_parser.add_argument("--webhook", metavar="URL",
+                                           help="also POST each alert as a JSON object to URL")
+        holding_alerts_parser.add_argument("--depth", type=int, default=TradeChainSearch.DEFAULT_MAX_DEPTH,
+                                           help="maximum number of trades in a chain (default:{})".format(
+                                               TradeChainSearch.DEFAULT_MAX_DEPTH))
+        holding_alerts_parser.add_argument("--node-budget", type=int, default=TradeChainSearch.DEFAULT_NODE_BUDGET,
+                                           help="maximum number of chain nodes to expand for each chain rule "
+                                                "(default:{})".format(TradeChainSearch.DEFAULT_NODE_BUDGET))
+        holding_alerts_parser.add_argument("-q", "--quote", metavar="CURRENCY",
+                                           help="compare prices and values in this currency (default:the first "
+                                                "--currency)")
+
+    batch_parser = context_parser_group.add_parser("batch")
+    batch_parser.set_defaults(handler=QueryHandlerBatch.handle_query_batch_evaluate, requires_holdings=False,
+                              default_format="jsonl", renders_table=False, daemon_capable=False, context="batch")
+    if context == "batch":
+        from .chains import TradeChainSearch
+
+        batch_parser.add_argument("portfolios", metavar="PORTFOLIOS",
+                                  help="directory of holdings files, or JSONL file of portfolios (- for stdin)")
+        batch_parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                                  help="number of worker processes (default:{})".format(os.cpu_count() or 1))
+        batch_parser.add_argument("-c", "--count", type=int, default=5,
+                                  help="specify maximum number of trades to report per holding, and of profitable "
+                                       "trades per portfolio (default:5)")
+        batch_parser.add_argument("--trades-from", action="store_true",
+                                  help="report available trades from held currencies")
+        batch_parser.add_argument("--trades-to", action="store_true",
+                                  help="report available trades to held currencies")
+        batch_parser.add_argument("--allow-trade-chains", action="store_true",
+                                  help="report profitable chains of trades rather than single trades")
+        batch_parser.add_argument("--min-ratio", type=float, default=1.0,
+                                  help="ratio each trade must exceed to be considered profitable (default:1.0)")
+        batch_parser.add_argument("--depth", type=int, default=TradeChainSearch.DEFAULT_MAX_DEPTH,
+                                  help="maximum number of trades in a chain (default:{})".format(
+                                      TradeChainSearch.DEFAULT_MAX_DEPTH))
+        batch_parser.add_argument("--node-budget", type=int, default=TradeChainSearch.DEFAULT_NODE_BUDGET,
+                                  help="maximum number of chain nodes to expand per portfolio (default:{})".format(
+                                      TradeChainSearch.DEFAULT_NODE_BUDGET))
+        batch_parser.add_argument("-q", "--quote", metavar="CURRENCY",
+                                  help="price the trades in this currency (default:the first --currency)")
+
+    serve_parser = context_parser_group.add_parser("serve")
+    serve_parser.set_defaults(handler=QueryHandlerDaemon.handle_query_daemon_serve, requires_holdings=False,
+                              handles_watch=True, daemon_capable=False, context="serve")
+
+    return parser
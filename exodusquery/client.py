@@ -0,0 +1,375 @@
+from time import time
+import json
+import os
+import threading
+
+from .common import DEFAULT_TIMEOUT, _logger, json_loads
+from .graph import PairTable, TradePairGraph
+from .metrics import _metrics
+
+
+class ExodusRoutes(object):
+    __PRICING__ = "https://pricing.a.exodus.io"
+    __EXCHANGE__ = "https://exchange.exodus.io"
+
+    def __init__(self, pricing_host=None, exchange_host=None):
+        """
+        :param pricing_host: optional base URL to use instead of the public pricing host.
+        :param exchange_host: optional base URL to use instead of the public exchange host.
+        """
+        self.pricing_host = (pricing_host or self.__PRICING__).rstrip("/")
+        self.exchange_host = (exchange_host or self.__EXCHANGE__).rstrip("/")
+
+    def _generate_route(self, host, endpoint):
+        return '{}/{}'.format(host, endpoint)
+
+    @property
+    def endpoint_ticker(self):
+        return self._generate_route(self.pricing_host, "ticker")
+
+    @property
+    def endpoint_current_price(self):
+        return self._generate_route(self.pricing_host, "current-price")
+
+    @property
+    def endpoint_exchange_pairs(self):
+        return self._generate_route(self.exchange_host, "v2/pairs")
+
+
+class RateLimitedError(Exception):
+    """
+    Raised when the Exodus API keeps responding with HTTP 429 after retries have been exhausted.
+    """
+
+    def __init__(self, url, retry_after=None):
+        super(RateLimitedError, self).__init__("Rate limited by {}".format(url))
+        self.url = url
+        self.retry_after = retry_after
+
+
+class CacheMissError(Exception):
+    """
+    Raised in offline mode when a response is not available from the cache.
+    """
+
+    def __init__(self, endpoint):
+        super(CacheMissError, self).__init__("No cached response available for {}".format(endpoint))
+        self.endpoint = endpoint
+
+
+class ResponseCache(object):
+    """
+    SQLite-backed store of decoded API responses, keyed by endpoint and request, so that repeated invocations
+    can reuse recent data instead of querying the API again.
+    """
+    FILENAME = "responses.sqlite"
+
+    def __init__(self, path):
+        """
+        :param path: str specifying the SQLite database file. Parent directories are created when needed.
+        """
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def default_directory():
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(base, "cryptoquery")
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            import sqlite3
+
+            self._connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS responses (endpoint TEXT NOT NULL, "
+                                     "key TEXT NOT NULL, fetched_at REAL NOT NULL, body TEXT NOT NULL, "
+                                     "PRIMARY KEY (endpoint, key))")
+        return self._connection
+
+    def get(self, endpoint, key, max_age=None):
+        """
+        :param endpoint: str identifying the endpoint.
+        :param key: str identifying the request made to the endpoint.
+        :param max_age: float maximum age in seconds of a usable response, or None to accept any age.
+        :return: tuple of (response data, timestamp it was fetched at), or None if there is no usable response.
+        """
+        with self._lock:
+            row = self._connect().execute("SELECT fetched_at, body FROM responses WHERE endpoint = ? AND key = ?",
+                                          (endpoint, key)).fetchone()
+        if row is None:
+            return None
+        fetched_at, body = row
+        if max_age is not None and time() - fetched_at > max_age:
+            return None
+        return json.loads(body), fetched_at
+
+    def put(self, endpoint, key, data):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("INSERT OR REPLACE INTO responses (endpoint, key, fetched_at, body) "
+                                   "VALUES (?, ?, ?, ?)", (endpoint, key, time(), json.dumps(data)))
+        return
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        return
+
+
+class ExodusClient(object):
+    """
+    HTTP client for the Exodus endpoints. Connections are pooled and kept alive between requests, every request
+    has a timeout, and failed requests are retried with exponential backoff. The session is only created, and
+    requests only imported, for the first request which cannot be answered from the cache.
+    """
+    DEFAULT_TIMEOUT = DEFAULT_TIMEOUT
+    DEFAULT_RETRIES = 3
+    DEFAULT_BACKOFF_FACTOR = 0.5
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+    DEFAULT_PAIRS_TTL = 300
+    DEFAULT_PRICES_TTL = 5
+    DEFAULT_PRICE_BATCH_SIZE = 250
+
+    def __init__(self, router=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR, pool_size=4, cache=None, pairs_ttl=DEFAULT_PAIRS_TTL,
+                 prices_ttl=DEFAULT_PRICES_TTL, offline=False, price_batch_size=DEFAULT_PRICE_BATCH_SIZE):
+        """
+        :param router: ExodusRoutes specifying the endpoints to use.
+        :param timeout: float number of seconds to wait for each request.
+        :param retries: int number of times to retry a failed request.
+        :param backoff_factor: float passed to urllib3, retry `n` waits `backoff_factor * 2 ** (n - 1)` seconds.
+        :param pool_size: int number of connections to keep alive per host.
+        :param cache: optional ResponseCache to reuse recent responses from.
+        :param pairs_ttl: float maximum age in seconds of a reusable cached pairs response.
+        :param prices_ttl: float maximum age in seconds of a reusable cached prices response.
+        :param offline: bool, only ever answer from the cache (of any age).
+        :param price_batch_size: int maximum number of symbols to ask for in each price request (0 for no limit).
+        """
+        self.router = router if router is not None else ExodusRoutes()
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self.cache = cache
+        self.pairs_ttl = pairs_ttl
+        self.prices_ttl = prices_ttl
+        self.offline = offline
+        self.price_batch_size = price_batch_size
+        self.last_fetched_at = None
+        self.session = None
+        self._executor = None
+        self._session_lock = threading.Lock()
+
+    def open(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="exodus-client")
+        return self
+
+    def _connect(self):
+        """
+        :return: the requests.Session to send requests with, created on first use.
+        """
+        with self._session_lock:
+            if self.session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                retry = Retry(total=self.retries, backoff_factor=self.backoff_factor,
+                              status_forcelist=self.RETRY_STATUS_CODES, allowed_methods=None, raise_on_status=False)
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+                self.session = requests.Session()
+                self.session.mount("https://", adapter)
+                self.session.mount("http://", adapter)
+            return self.session
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        if self.cache is not None:
+            self.cache.close()
+        return
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return
+
+    @staticmethod
+    def _check_rate_limit(response):
+        if response.status_code != 429:
+            return
+        retry_after = response.headers.get("Retry-After")
+        try:
+            retry_after = float(retry_after) if retry_after is not None else None
+        except ValueError:
+            retry_after = None
+        raise RateLimitedError(response.url, retry_after=retry_after)
+
+    def _cached(self, endpoint, key, max_age, fetch, encode=None, decode=None):
+        if self.cache is not None:
+            entry = self.cache.get(endpoint, key, max_age=None if self.offline else max_age)
+            if entry is not None:
+                _logger.debug("using cached response for {}".format(endpoint))
+                _metrics.increment("cache_hits")
+                data, fetched_at = entry
+                return (decode(data) if decode is not None else data), fetched_at
+            _metrics.increment("cache_misses")
+        if self.offline:
+            raise CacheMissError(endpoint)
+        data = fetch()
+        if data is not None and self.cache is not None:
+            self.cache.put(endpoint, key, encode(data) if encode is not None else data)
+        return data, time()
+
+    def get_trade_pair_table(self, max_age=None):
+        """
+        Query the exchange endpoint to acquire the available trades between symbols.
+        :param max_age: float maximum age in seconds of a reusable cached response (default: `pairs_ttl`).
+        :return: PairTable
+        """
+        table, _ = self._cached(self.router.endpoint_exchange_pairs, "table",
+                                self.pairs_ttl if max_age is None else max_age, self._fetch_trade_pair_table,
+                                encode=PairTable.to_data, decode=PairTable.from_data)
+        return table if table is not None else PairTable()
+
+    def get_trade_pairs(self, max_age=None):
+        """
+        Query the exchange endpoint to acquire the available trades between symbols.
+        :param max_age: float maximum age in seconds of a reusable cached response (default: `pairs_ttl`).
+        :return: list of TradePair objects
+        """
+        return self.get_trade_pair_table(max_age=max_age).trade_pairs()
+
+    def _fetch_trade_pair_table(self):
+        from .decode import decode_pairs_response, ijson
+
+        session = self._connect()
+        with _metrics.timer("http_pairs"):
+            response = session.get(self.router.endpoint_exchange_pairs, timeout=self.timeout, stream=True)
+        try:
+            self._check_rate_limit(response)
+            if response.status_code != 200:
+                _metrics.increment("http_errors")
+                return None
+            # with ijson the body is read while it is decoded, so decode_pairs includes part of the transfer
+            with _metrics.timer("decode_pairs"):
+                if ijson is not None:
+                    response.raw.decode_content = True
+                    return decode_pairs_response(response.raw)
+                return decode_pairs_response(response.content)
+        finally:
+            response.close()
+
+    def get_ticker_symbols(self, currency, max_age=None):
+        """
+        Query the ticker endpoint for every symbol it lists.
+        :param currency: str specifying the currency to ask the ticker for.
+        :param max_age: float maximum age in seconds of a reusable cached response (default: `pairs_ttl`).
+        :return: sorted list(str) of symbols, or None if the ticker could not be read.
+        """
+        symbols, _ = self._cached(self.router.endpoint_ticker, currency, self.pairs_ttl if max_age is None else max_age,
+                                  lambda: self._fetch_ticker_symbols(currency))
+        return symbols or None
+
+    def _fetch_ticker_symbols(self, currency):
+        session = self._connect()
+        with _metrics.timer("http_ticker"):
+            response = session.get(self.router.endpoint_ticker, params={"to": currency}, timeout=self.timeout)
+        self._check_rate_limit(response)
+        if response.status_code != 200:
+            _metrics.increment("http_errors")
+            return None
+        data = json_loads(response.content)
+        return sorted(data) if isinstance(data, dict) else None
+
+    def get_current_symbol_price_data(self, symbols_from, currencies, max_age=None):
+        """
+        Query the pricing endpoint to retrieve the current prices of the symbols specified in `symbols_from`.
+        Symbols beyond `price_batch_size` are split into several requests, which are sent concurrently.
+        :param symbols_from: list(str) specifying the symbols to get price information for.
+        :param currencies: list(str) specifying the currencies to price the symbols in, all fetched in one request.
+        :param max_age: float maximum age in seconds of a reusable cached response (default: `prices_ttl`).
+        :return: dict() containing price information for each symbol, keyed by currency.
+        """
+        assert type(symbols_from) is list
+        symbols_from = sorted(set(symbols_from))
+        size = self.price_batch_size or len(symbols_from) or 1
+        batches = [symbols_from[i:i + size] for i in range(0, len(symbols_from), size)] or [[]]
+        futures = [self._executor.submit(self._get_price_batch, x, currencies, max_age) for x in batches[1:]]
+        symbol_price_data, fetched_at = self._get_price_batch(batches[0], currencies, max_age)
+        symbol_price_data = dict(symbol_price_data or {})
+        for future in futures:
+            batch_data, batch_fetched_at = future.result()
+            symbol_price_data.update(batch_data or {})
+            fetched_at = min(fetched_at, batch_fetched_at)
+        # the snapshot is only as fresh as its oldest batch
+        self.last_fetched_at = fetched_at
+        return symbol_price_data
+
+    def _get_price_batch(self, symbols_from, currencies, max_age):
+        key = "{}:{}".format(",".join(sorted(currencies)), ",".join(symbols_from))
+        return self._cached(self.router.endpoint_current_price, key, self.prices_ttl if max_age is None else max_age,
+                            lambda: self._fetch_current_symbol_price_data(symbols_from, currencies))
+
+    def _fetch_current_symbol_price_data(self, symbols_from, currencies):
+        session = self._connect()
+        with _metrics.timer("http_prices"):
+            response = session.post(
+                self.router.endpoint_current_price,
+                json={
+                    "assets": {
+                        "from": symbols_from,
+                        "to": list(currencies)
+                    }
+                },
+                timeout=self.timeout
+            )
+        self._check_rate_limit(response)
+        if not response.status_code == 200:
+            _metrics.increment("http_errors")
+            return None
+        with _metrics.timer("decode_prices"):
+            return json_loads(response.content)
+
+    def get_market_data(self, symbols_from, currencies, max_age=None, symbols_for=None):
+        """
+        Fetch the trade pairs and the current prices of `symbols_from` concurrently.
+        :param symbols_from: list(str) specifying the symbols to get price information for.
+        :param currencies: list(str) specifying the currencies to price the symbols in.
+        :param max_age: optional float overriding the maximum age of reusable cached responses.
+        :param symbols_for: optional callable taking the TradePairGraph and returning every symbol to price. Those
+            not in `symbols_from` are priced once the pairs have arrived, and prices of symbols not returned are
+            dropped.
+        :return: tuple of (TradePairGraph, dict() of price information).
+        """
+        pairs_future = self._executor.submit(self.get_trade_pair_table, max_age)
+        symbol_price_data = {}
+        self.last_fetched_at = None
+        if symbols_from:
+            symbol_price_data = self.get_current_symbol_price_data(symbols_from, currencies, max_age=max_age)
+        trade_graph = TradePairGraph.from_table(pairs_future.result())
+        if symbols_for is not None:
+            symbols = set(symbols_for(trade_graph))
+            discovered = sorted(symbols.difference(symbols_from))
+            if discovered:
+                fetched_at = self.last_fetched_at
+                symbol_price_data.update(self.get_current_symbol_price_data(discovered, currencies, max_age=max_age))
+                if fetched_at is not None:
+                    self.last_fetched_at = min(fetched_at, self.last_fetched_at)
+            symbol_price_data = {x: v for (x, v) in symbol_price_data.items() if x in symbols}
+        return trade_graph, symbol_price_data
@@ -0,0 +1,35 @@
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+json_loads = orjson.loads if orjson is not None else json.loads
+
+_logger = logging.getLogger()
+
+# defaults which the command line shows, kept here so that parsing it imports none of the modules they belong to
+DEFAULT_TIMEOUT = 10
+DEFAULT_PRICES_INTERVAL = 2.0
+DEFAULT_PAIRS_INTERVAL = 60.0
+DEFAULT_JITTER = 0.1
+
+
+class TradeDirection:
+    DIR_FRM = 1
+    DIR_TO = 2
+    DIR_BOTH = 3
+
+
+def _first_item(x):
+    return x[0]
+
+
+def _second_item(x):
+    return x[1]
+
+
+def _json_bytes(data):
+    return orjson.dumps(data) if orjson is not None else json.dumps(data).encode("utf-8")
@@ -0,0 +1,278 @@
+from time import time
+import logging
+import os
+import socket
+import threading
+
+from .client import ExodusClient, ExodusRoutes, ResponseCache
+from .common import _json_bytes, _logger, json_loads
+from .market import ExodusQuery
+from .metrics import _metrics
+from .render import RecordListSink, TableSink
+
+
+class RequestLogCapture(logging.Handler):
+    """
+    Collects the records logged by a thread while it is capturing, and keeps them away from the other handlers, so
+    that the daemon can return what a handler logged to the client which asked for it.
+    """
+
+    def __init__(self):
+        super(RequestLogCapture, self).__init__()
+        self._local = threading.local()
+
+    def install(self, logger):
+        logger.addHandler(self)
+        for handler in logger.handlers:
+            if handler is not self:
+                handler.addFilter(self.is_not_capturing)
+        return self
+
+    def is_not_capturing(self, record):
+        return getattr(self._local, "lines", None) is None
+
+    def start(self):
+        self._local.lines = []
+        return
+
+    def stop(self):
+        lines, self._local.lines = self._local.lines, None
+        return lines
+
+    def emit(self, record):
+        lines = getattr(self._local, "lines", None)
+        if lines is not None:
+            lines.append([record.levelno, record.getMessage()])
+        return
+
+
+def parse_daemon_address(address):
+    """
+    :param address: str, either HOST:PORT or the path of a Unix socket.
+    :return: tuple of (socket family, address).
+    """
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, os.path.expanduser(address)
+
+
+def default_daemon_address():
+    if hasattr(socket, "AF_UNIX"):
+        return os.path.join(ResponseCache.default_directory(), "daemon.sock")
+    return "127.0.0.1:8719"
+
+
+class QueryDaemon(object):
+    """
+    Serves the generic and holding actions from the snapshot of a query which is kept refreshed in the
+    background, over HTTP on a Unix socket or local TCP port.
+
+    `POST /query` takes `{"argv": [...], "holdings": [[symbol, quantity], ...]}` and answers with
+    `{"status": "ok", "fetched_at": ..., "log": [[level, message], ...], "records": [...]}`: what the action logged,
+    and what it wrote to its sink. Requests the daemon cannot answer as well as a fresh query could (other endpoints
+    or currencies, a snapshot older than --max-age or the prices TTL, symbols it has not priced) are refused with
+    status 409, and the client runs them itself. `GET /status` describes the current snapshot.
+    """
+
+    def __init__(self, query, address):
+        """
+        :param query: ExodusQuery to answer from, refreshed by the caller.
+        :param address: str, either HOST:PORT or the path of a Unix socket.
+        """
+        self.query = query
+        self.address = address
+        self.capture = RequestLogCapture().install(_logger)
+        self._server = None
+
+    def status(self):
+        snapshot = self.query.snapshot
+        return {"status": "ok", "fetched_at": snapshot.fetched_at, "version": snapshot.version,
+                "currencies": snapshot.currencies, "pairs": len(snapshot.trade_graph),
+                "symbols": len(snapshot.symbol_price_data), "pricing_url": self.query.router.pricing_host,
+                "exchange_url": self.query.router.exchange_host}
+
+    def run_query(self, request):
+        """
+        :param request: dict() decoded from the body of a `/query` request.
+        :return: tuple of (HTTP status, dict() to respond with).
+        """
+        from .cli import is_watching, parse_arguments, parse_currencies
+
+        try:
+            args = parse_arguments(request["argv"])
+        except SystemExit:
+            return 400, {"status": "error", "message": "invalid arguments"}
+        if not hasattr(args, "handler") or not getattr(args, "daemon_capable", True) or is_watching(args):
+            return 400, {"status": "error", "message": "action cannot be run by the daemon"}
+        routes = ExodusRoutes(args.pricing_url, args.exchange_url)
+        if (routes.pricing_host, routes.exchange_host) != (self.query.router.pricing_host,
+                                                           self.query.router.exchange_host):
+            return 409, {"status": "error", "message": "daemon queries other endpoints"}
+        snapshot = self.query.snapshot
+        currencies = parse_currencies(args)
+        missing = [x for x in currencies if x not in snapshot.currencies]
+        if missing:
+            return 409, {"status": "error", "message": "daemon has no prices in {}".format(",".join(missing))}
+        max_age = args.max_age if args.max_age is not None else ExodusClient.DEFAULT_PRICES_TTL
+        if time() - (snapshot.fetched_at or 0) > max_age:
+            return 409, {"status": "error", "message": "daemon snapshot is older than {}s".format(max_age)}
+        holdings = [(symbol, quantity) for symbol, quantity in request.get("holdings", [])]
+        unpriced = [x for x, _ in holdings if snapshot.price(x) is None]
+        if unpriced:
+            # price them from the next refresh on
+            self.query.holding_symbols.update(unpriced)
+            return 409, {"status": "error", "message": "daemon has not priced {}".format(",".join(unpriced))}
+
+        if currencies[0] != snapshot.currency:
+            snapshot = snapshot.in_currency(currencies[0])
+        if getattr(args, "workers", 1) > 1:
+            # never fork worker processes from the server's threads
+            args.workers = 1
+        query = ExodusQuery.from_snapshot(snapshot)
+        query.currencies = currencies
+        output_format = args.format or getattr(args, "default_format", "table")
+        # tables are logged, and returned with the rest of the log
+        args.sink = RecordListSink() if output_format != "table" else TableSink()
+        self.capture.start()
+        try:
+            args.handler(query=query, holdings=holdings, args=args)
+        except Exception as e:
+            self.capture.stop()
+            _logger.exception("daemon query failed")
+            return 500, {"status": "error", "message": str(e)}
+        log = self.capture.stop()
+        _metrics.increment("daemon_queries")
+        return 200, {"status": "ok", "fetched_at": snapshot.fetched_at, "log": log,
+                     "records": getattr(args.sink, "data", [])}
+
+    def start(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        import socketserver
+
+        daemon = self
+
+        class DaemonRequestHandler(BaseHTTPRequestHandler):
+            def _respond(self, status, data):
+                body = _json_bytes(data)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/status":
+                    self._respond(200, daemon.status())
+                else:
+                    self._respond(404, {"status": "error", "message": "not found"})
+
+            def do_POST(self):
+                if self.path != "/query":
+                    self._respond(404, {"status": "error", "message": "not found"})
+                    return
+                try:
+                    request = json_loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                except ValueError:
+                    self._respond(400, {"status": "error", "message": "invalid json"})
+                    return
+                with _metrics.timer("daemon_query"):
+                    self._respond(*daemon.run_query(request))
+
+            def log_message(self, format, *args):
+                _logger.debug("daemon: " + format % args)
+
+        family, address = parse_daemon_address(self.address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(address):
+                if DaemonClient(self.address).status() is not None:
+                    raise OSError("a daemon is already listening on {}".format(address))
+                os.unlink(address)
+            os.makedirs(os.path.dirname(address) or ".", exist_ok=True)
+
+            class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+                daemon_threads = True
+
+            self._server = UnixHTTPServer(address, DaemonRequestHandler)
+        else:
+            self._server = ThreadingHTTPServer(address, DaemonRequestHandler)
+            self._server.daemon_threads = True
+        _logger.info("serving queries on {}".format(self.address))
+        return self
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    def close(self):
+        if self._server is None:
+            return
+        self._server.server_close()
+        family, address = parse_daemon_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)
+        self._server = None
+        return
+
+
+class DaemonClient(object):
+    """
+    Client for a QueryDaemon. Every method returns None if no daemon is listening, or if it refuses the request.
+    """
+    CONNECT_TIMEOUT = 0.5
+
+    def __init__(self, address, timeout=ExodusClient.DEFAULT_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+
+    def _connection(self):
+        import http.client
+
+        family, address = parse_daemon_address(self.address)
+
+        class DaemonConnection(http.client.HTTPConnection):
+            # give up quickly on a daemon which is not accepting connections, but give one which is the full timeout
+            # to answer
+            def connect(self):
+                if family == socket.AF_INET:
+                    self.sock = socket.create_connection(address, DaemonClient.CONNECT_TIMEOUT)
+                else:
+                    self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    self.sock.settimeout(DaemonClient.CONNECT_TIMEOUT)
+                    self.sock.connect(address)
+                self.sock.settimeout(self.timeout)
+
+        return DaemonConnection("localhost", timeout=self.timeout)
+
+    def _request(self, method, path, body=None):
+        family, address = parse_daemon_address(self.address)
+        if family == socket.AF_UNIX and not os.path.exists(address):
+            return None
+        connection = self._connection()
+        try:
+            connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            data = json_loads(response.read())
+        except (OSError, ValueError) as e:
+            _logger.debug("no daemon at {}: {}".format(self.address, e))
+            return None
+        finally:
+            connection.close()
+        if response.status != 200:
+            _logger.debug("daemon refused the query: {}".format(data.get("message")))
+            return None
+        return data
+
+    def status(self):
+        return self._request("GET", "/status")
+
+    def query(self, argv, holdings):
+        """
+        :param argv: list(str) of command line arguments to run.
+        :param holdings: list of (symbol, quantity) tuples.
+        :return: dict() of the daemon's response, or None.
+        """
+        return self._request("POST", "/query", _json_bytes({"argv": list(argv), "holdings": holdings}))
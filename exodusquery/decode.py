@@ -0,0 +1,44 @@
+import io
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+from .common import json_loads
+from .graph import PairTable
+
+
+def decode_pairs_response(body):
+    """
+    Decode a `v2/pairs` response straight into a PairTable. The response is streamed with ijson when it is
+    installed, otherwise decoded in one go (with orjson when it is installed).
+    :param body: bytes, or a binary file-like object to stream from.
+    :return: PairTable, or None if the response does not report success.
+    """
+    table = PairTable()
+    if ijson is not None:
+        if isinstance(body, bytes):
+            body = io.BytesIO(body)
+        status = pair = rate = None
+        for prefix, event, value in ijson.parse(body, use_float=True):
+            if prefix == "data.item.pair":
+                pair = value
+            elif prefix == "data.item.rate":
+                rate = value
+            elif prefix == "data.item" and event == "end_map":
+                if pair is not None:
+                    table.add_pair(pair, rate)
+                pair = rate = None
+            elif prefix == "status":
+                status = value
+        return table if status == "success" else None
+
+    if not isinstance(body, bytes):
+        body = body.read()
+    response_json = json_loads(body)
+    if response_json.get('status', None) != "success":
+        return None
+    for x in response_json.get('data', []):
+        table.add_pair(x.get('pair'), x.get('rate'))
+    return table
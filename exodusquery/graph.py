@@ -0,0 +1,175 @@
+from array import array
+import sys
+
+from .common import TradeDirection
+
+
+class TradeElement(object):
+    __slots__ = ("symbol",)
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def __repr__(self):
+        return self.symbol
+
+
+class TradePair(object):
+    __slots__ = ("left", "right", "conversion_rate")
+
+    @classmethod
+    def pair_from_data(cls, data):
+        pair_left, pair_right = data.get('pair').split("_")
+        element_left = TradeElement(pair_left)
+        element_right = TradeElement(pair_right)
+        conversion_rate = data.get('rate')
+        pair = TradePair(element_left, element_right, conversion_rate)
+        return pair
+
+    def __init__(self, left_element, right_element, conversion_rate):
+        self.left = left_element
+        self.right = right_element
+        self.conversion_rate = conversion_rate
+
+    @property
+    def symbols(self):
+        return [self.left.symbol, self.right.symbol]
+
+    @property
+    def key(self):
+        return self.left.symbol, self.right.symbol
+
+    def __repr__(self):
+        return "{}:{} ({})".format(self.left, self.right, self.conversion_rate)
+
+
+class PairTable(object):
+    """
+    Compact column store of the trade pairs. Symbols are interned to integer ids, and the left ids, right ids
+    and rates of the pairs are held in contiguous arrays.
+    """
+    __slots__ = ("symbols", "symbol_ids", "left", "right", "rates")
+
+    def __init__(self):
+        self.symbols = []
+        self.symbol_ids = {}
+        self.left = array('i')
+        self.right = array('i')
+        self.rates = array('d')
+
+    def symbol_id(self, symbol):
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self.symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(sys.intern(symbol))
+        return symbol_id
+
+    def add(self, left_symbol, right_symbol, rate):
+        self.left.append(self.symbol_id(left_symbol))
+        self.right.append(self.symbol_id(right_symbol))
+        self.rates.append(rate or 0.0)
+
+    def add_pair(self, pair, rate):
+        """
+        :param pair: str in the `LEFT_RIGHT` format used by the exchange endpoint.
+        :param rate: conversion rate of the pair.
+        """
+        left_symbol, right_symbol = pair.split("_")
+        self.add(left_symbol, right_symbol, rate)
+
+    def trade_pairs(self):
+        """
+        :return: list of TradePair objects, sharing one TradeElement per symbol.
+        """
+        elements = [TradeElement(x) for x in self.symbols]
+        return [TradePair(elements[left], elements[right], rate)
+                for left, right, rate in zip(self.left, self.right, self.rates)]
+
+    def to_data(self):
+        return {"symbols": self.symbols, "left": self.left.tolist(), "right": self.right.tolist(),
+                "rates": self.rates.tolist()}
+
+    @classmethod
+    def from_data(cls, data):
+        table = cls()
+        table.symbols = [sys.intern(x) for x in data["symbols"]]
+        table.symbol_ids = {x: i for i, x in enumerate(table.symbols)}
+        table.left = array('i', data["left"])
+        table.right = array('i', data["right"])
+        table.rates = array('d', data["rates"])
+        return table
+
+    def __len__(self):
+        return len(self.rates)
+
+
+class TradePairGraph(object):
+    """
+    Adjacency index over the available trade pairs, keyed by symbol in both directions.
+    """
+
+    @classmethod
+    def from_table(cls, table):
+        graph = cls(table.trade_pairs())
+        graph.table = table
+        return graph
+
+    def __init__(self, trade_pairs=None):
+        self.table = None
+        self._pairs = []
+        self._outgoing = {}
+        self._incoming = {}
+        self._by_key = {}
+        for trade_pair in trade_pairs or []:
+            self.add_pair(trade_pair)
+
+    def add_pair(self, trade_pair):
+        self._pairs.append(trade_pair)
+        self._by_key[trade_pair.key] = trade_pair
+        self._outgoing.setdefault(trade_pair.left.symbol, []).append(trade_pair)
+        self._incoming.setdefault(trade_pair.right.symbol, []).append(trade_pair)
+
+    @property
+    def pairs(self):
+        return self._pairs
+
+    @property
+    def symbols(self):
+        return set(self._outgoing).union(self._incoming)
+
+    def pair(self, left_symbol, right_symbol):
+        """
+        :return: the TradePair from `left_symbol` to `right_symbol`, or None if there is no such pair.
+        """
+        return self._by_key.get((left_symbol, right_symbol))
+
+    def outgoing(self, symbol):
+        """
+        :param symbol: str specifying the symbol being traded from.
+        :return: list of TradePair objects whose left element is `symbol`.
+        """
+        return self._outgoing.get(symbol, [])
+
+    def incoming(self, symbol):
+        """
+        :param symbol: str specifying the symbol being traded to.
+        :return: list of TradePair objects whose right element is `symbol`.
+        """
+        return self._incoming.get(symbol, [])
+
+    def pairs_for_symbol(self, symbol, direction=TradeDirection.DIR_BOTH):
+        """
+        Look up the pairs linked to `symbol`, filtered by trade direction.
+        :param symbol: str specifying the symbol of interest.
+        :param direction: TradeDirection flags. A value of 0 is treated as DIR_BOTH.
+        :return: list of TradePair objects.
+        """
+        if direction == TradeDirection.DIR_FRM:
+            return list(self.outgoing(symbol))
+        if direction == TradeDirection.DIR_TO:
+            return list(self.incoming(symbol))
+        # a pair from a symbol to itself lives in both indexes, so only take it once
+        return self.outgoing(symbol) + [x for x in self.incoming(symbol) if x.left.symbol != symbol]
+
+    def __len__(self):
+        return len(self._pairs)
@@ -0,0 +1,621 @@
+from time import time
+import copy
+import heapq
+
+from .client import ExodusClient
+from .common import TradeDirection, _first_item, _logger
+from .graph import TradePairGraph
+from .metrics import _metrics
+
+
+class ExodusQuery(object):
+    # only asked for when neither the pairs nor the ticker can say which symbols exist
+    ALL_SYMBOLS = ["ZRX", "AAVE", "ADT", "ARN", "AION", "AST", "ALGO", "AMB", "APPC", "ANT", "ANTv1", "ARK", "REP",
+                   "REPv1", "BAL", "BNT", "BAT", "BNB", "BTC", "BCH", "BTG", "BSV", "BTT", "BFT", "BRD", "SNGLS", "ADA",
+                   "LINK", "CND", "CVC", "COMP", "CDAI", "ATOM", "CRO", "CRV", "DAI", "DASH", "MANA", "DCR", "DENT",
+                   "DCN", "DGB", "DGD", "DNT", "DOGE", "DRGN", "EDG", "EOS", "ETH", "ETC", "1ST", "FUN", "GUSD", "GVT",
+                   "GNO", "GLM", "GNT", "HBAR", "ICX", "RLC", "KIN", "KNC", "LSK", "LTC", "LOOM", "LUN", "MKR", "GUP",
+                   "MCO", "MDS", "MLN", "MTL", "MITH", "XMR", "NANO", "XEM", "NEO", "GAS", "NMR", "OMG", "ONT", "ONG",
+                   "PAXG", "PAX", "PLR", "POE", "DOT", "POLY", "PPT", "POWR", "QASH", "QTUM", "QSP", "RDN", "RVN",
+                   "REN", "REQ", "REV", "RCN", "RVT", "SAI", "SALT", "SAN", "SRM", "SOL", "SX", "SNT", "XLM", "STORJ",
+                   "STORM", "STMX", "SUSHI", "SNX", "TAAS", "PAY", "USDT", "XTZ", "TNB", "TRX", "TUSD", "UMA", "UNI",
+                   "LEO", "USDC", "VET", "VERI", "VTC", "VTHO", "VIB", "VGX", "WTC", "WAVES", "WAX", "TRST", "WINGS",
+                   "WBTC", "XRP", "YFI", "ZEC", "ZIL"]
+
+    def __init__(self, currency="GBP", client=None, with_pairs=True, recorder=None, currencies=None, symbols=None,
+                 holding_symbols=None):
+        """
+        :param currency: str specifying the currency to price symbols in by default.
+        :param client: ExodusClient (or ReplayClient) used to obtain market data.
+        :param with_pairs: bool, fetch the trade pairs. Price-only queries can skip them.
+        :param recorder: optional SnapshotRecorder which every refreshed snapshot is appended to.
+        :param currencies: optional list(str) of further currencies to fetch prices in alongside `currency`.
+        :param symbols: optional list(str) of the only symbols to price. By default, every symbol in the trade pairs
+            is priced, or every symbol on the ticker for queries without pairs.
+        :param holding_symbols: optional iterable of symbols to price alongside those found in the pairs.
+        """
+        self.currency = currency
+        self.currencies = [currency]
+        for x in currencies or []:
+            if x not in self.currencies:
+                self.currencies.append(x)
+        self.client = client if client is not None else ExodusClient()
+        self.with_pairs = with_pairs
+        self.recorder = recorder
+        self.fixed_symbols = list(symbols) if symbols is not None else None
+        self.holding_symbols = set(holding_symbols or [])
+        self.snapshot = MarketSnapshot([], {}, currency, currencies=self.currencies)
+        self._symbols = None
+        self._priced_symbols = None
+
+    @classmethod
+    def from_snapshot(cls, snapshot, symbols=None):
+        """
+        Query over a fixed snapshot, for analysing market data without fetching it.
+        :param snapshot: MarketSnapshot
+        :param symbols: optional list(str) to use in place of the symbols in the snapshot's pairs.
+        :return: ExodusQuery
+        """
+        query = cls(snapshot.currency, currencies=snapshot.currencies, symbols=symbols)
+        query.snapshot = snapshot
+        return query
+
+    @property
+    def symbols(self):
+        """
+        :return: sorted list(str) of the symbols in the current snapshot: those in its pairs and the holding
+            symbols, or those priced if it has no pairs.
+        """
+        if self._symbols is None:
+            if self.fixed_symbols is not None:
+                self._symbols = self.fixed_symbols
+            elif len(self.snapshot.trade_graph):
+                self._symbols = sorted(self.snapshot.trade_graph.symbols.union(self.holding_symbols))
+            else:
+                self._symbols = sorted(self.snapshot.symbol_price_data)
+        return self._symbols
+
+    def symbol_universe(self, trade_graph):
+        """
+        :param trade_graph: TradePairGraph whose symbols to price.
+        :return: sorted list(str) of the symbols to price: those taking part in the pairs, or listed by the ticker
+            if there are no pairs, and the holding symbols.
+        """
+        if self.fixed_symbols is not None:
+            return self.fixed_symbols
+        symbols = trade_graph.symbols
+        if not symbols:
+            symbols = set(self.client.get_ticker_symbols(self.currency) or self.ALL_SYMBOLS)
+        return sorted(symbols.union(self.holding_symbols))
+
+    def _update_priced_symbols(self, trade_graph):
+        self._priced_symbols = self.symbol_universe(trade_graph)
+        return self._priced_symbols
+
+    def ensure_prices(self, symbols):
+        """
+        Price `symbols` from now on, along with those in the pairs, refreshing the prices straight away if any of
+        them are missing from the current snapshot.
+        :param symbols: iterable of symbols.
+        :return: the current MarketSnapshot, refreshed if it had to be.
+        """
+        symbols = set(symbols)
+        if symbols.issubset(self.symbols):
+            return self.snapshot
+        self.holding_symbols.update(symbols)
+        return self.refresh(pairs=False)
+
+    @property
+    def router(self):
+        return self.client.router
+
+    def __enter__(self):
+        _logger.debug("Initialising new Exodus query context")
+        self.client.open()
+        self.refresh()
+        _logger.debug("Initialisation complete")
+        return self
+
+    def refresh(self, pairs=True, max_age=None):
+        """
+        Fetch the current prices, and optionally the pairs, and replace `snapshot` with a new MarketSnapshot.
+        Snapshots handed out previously are left untouched.
+        :param pairs: bool, also re-fetch the trade pairs. Otherwise the pairs of the current snapshot are reused.
+            Ignored if the query was created without pairs.
+        :param max_age: optional float overriding the maximum age of reusable cached responses.
+        :return: the new MarketSnapshot.
+        """
+        with _metrics.timer("refresh"):
+            if pairs and self.with_pairs:
+                if self.fixed_symbols is not None:
+                    trade_pairs, symbol_price_data = self.client.get_market_data(self.fixed_symbols, self.currencies,
+                                                                                 max_age=max_age)
+                else:
+                    # price the symbols of the last refresh while the pairs are fetched, then any the pairs add
+                    known = self._priced_symbols or sorted(self.holding_symbols)
+                    trade_pairs, symbol_price_data = self.client.get_market_data(
+                        known, self.currencies, max_age=max_age, symbols_for=self._update_priced_symbols)
+            else:
+                trade_pairs = self.snapshot.trade_graph
+                # the ticker is only read again along with the pairs
+                if pairs or len(trade_pairs) or self._priced_symbols is None:
+                    self._priced_symbols = self.symbol_universe(trade_pairs)
+                symbol_price_data = self.client.get_current_symbol_price_data(self._priced_symbols, self.currencies,
+                                                                              max_age=max_age)
+            self.snapshot = MarketSnapshot(trade_pairs, symbol_price_data, self.currency,
+                                           fetched_at=self.client.last_fetched_at or time(),
+                                           version=self.snapshot.version + 1, currencies=self.currencies)
+            self._symbols = None
+        _metrics.set_gauge("snapshot_pairs", len(self.snapshot.trade_graph))
+        if self.recorder is not None:
+            self.recorder.record(self.snapshot)
+        return self.snapshot
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _logger.debug("Finalising Exodus query context")
+        self.client.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        return
+
+    @property
+    def trade_graph(self):
+        return self.snapshot.trade_graph
+
+    @property
+    def trade_pairs(self):
+        return self.snapshot.trade_pairs
+
+    @property
+    def rate_matrix(self):
+        return self.snapshot.rate_matrix
+
+    @property
+    def symbol_price_list(self):
+        return self.snapshot.symbol_price_list
+
+    def price_list(self, currency=None):
+        return self.snapshot.price_list(currency)
+
+    def price_from_symbol(self, symbol, currency=None):
+        return self.snapshot.price_from_symbol(symbol, currency)
+
+    def exchange_get_trade_pairs_for_symbol(self, symbol, direction=TradeDirection.DIR_BOTH):
+        return self.snapshot.trade_graph.pairs_for_symbol(symbol, direction=direction)
+
+    def active_trade_for_pair(self, exchange_pair, quantity):
+        return self.snapshot.active_trade_for_pair(exchange_pair, quantity)
+
+    def get_available_trades_for_holdings(self, holdings, direction=TradeDirection.DIR_BOTH, count=0):
+        return self.snapshot.get_available_trades_for_holdings(holdings, direction=direction, count=count)
+
+
+class MarketSnapshot(object):
+    """
+    Immutable view of the market at one point in time: the trade pair graph and a table of the prices of each
+    symbol in each of `currencies`. Prices are quoted in `currency` unless another currency is asked for, and
+    `in_currency` gives a view of the same data quoted in another currency. Trades priced from a snapshot
+    reference it rather than copying prices, so they stay valid after the owning ExodusQuery refreshes.
+    """
+    __slots__ = ("_trade_graph", "_symbol_price_data", "_price_table", "_prices", "_currency", "_currencies",
+                 "_fetched_at", "_version", "_rate_matrix", "_views")
+
+    def __init__(self, trade_pairs, symbol_price_data, currency, fetched_at=None, version=0, currencies=None):
+        """
+        :param trade_pairs: list of TradePair objects, or a TradePairGraph.
+        :param symbol_price_data: dict() as returned by the pricing endpoint.
+        :param currency: str specifying the currency prices are quoted in by default.
+        :param fetched_at: float timestamp of when the data was retrieved.
+        :param version: int which increases with every snapshot produced by a query.
+        :param currencies: optional list(str) of every currency in `symbol_price_data` (default: `currency`).
+        """
+        self._trade_graph = trade_pairs if isinstance(trade_pairs, TradePairGraph) else TradePairGraph(trade_pairs)
+        self._symbol_price_data = symbol_price_data
+        self._currencies = tuple(currencies) if currencies else (currency,)
+        if currency not in self._currencies:
+            self._currencies = (currency,) + self._currencies
+        self._price_table = {c: {x: v.get(c) for (x, v) in symbol_price_data.items()} for c in self._currencies}
+        self._prices = self._price_table[currency]
+        self._currency = currency
+        self._fetched_at = fetched_at
+        self._version = version
+        self._rate_matrix = None
+        self._views = {currency: self}
+
+    @property
+    def trade_graph(self):
+        return self._trade_graph
+
+    @property
+    def trade_pairs(self):
+        return self._trade_graph.pairs
+
+    @property
+    def currency(self):
+        return self._currency
+
+    @property
+    def currencies(self):
+        return self._currencies
+
+    @property
+    def fetched_at(self):
+        return self._fetched_at
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def symbol_price_list(self):
+        return list(self._prices.items())
+
+    @property
+    def symbol_price_data(self):
+        return self._symbol_price_data
+
+    def price_list(self, currency=None):
+        """
+        :param currency: optional str specifying one of `currencies` to quote in (default: `currency`).
+        :return: list of (symbol, price) tuples.
+        """
+        return list(self._quotes(currency).items())
+
+    def price(self, symbol, currency=None):
+        """
+        :param symbol: str
+        :param currency: optional str specifying one of `currencies` to quote in (default: `currency`).
+        :return: the price of `symbol`, or None if it is unknown.
+        """
+        return self._quotes(currency).get(symbol)
+
+    def price_from_symbol(self, symbol, currency=None):
+        prices = self._quotes(currency)
+        if symbol in prices:
+            return prices[symbol]
+        raise Exception("Could not query price for {} in {}".format(symbol, currency or self._currency))
+
+    def _quotes(self, currency):
+        if currency is None:
+            return self._prices
+        return self._price_table.get(currency, {})
+
+    def in_currency(self, currency):
+        """
+        View of this snapshot quoted in another of its currencies, sharing the pairs and the price table.
+        :param currency: str specifying one of `currencies`.
+        :return: MarketSnapshot
+        """
+        view = self._views.get(currency)
+        if view is None:
+            if currency not in self._price_table:
+                raise ValueError("{} has no prices in {}".format(self, currency))
+            view = copy.copy(self)
+            view._prices = self._price_table[currency]
+            view._currency = currency
+            view._rate_matrix = None
+            self._views[currency] = view
+        return view
+
+    @property
+    def rate_matrix(self):
+        """
+        Vectorised view of the pairs and prices, built on first use.
+        :return: RateMatrix, or None if NumPy is not available.
+        """
+        from .matrix import RateMatrix, numpy
+
+        if numpy is None:
+            return None
+        if self._rate_matrix is None:
+            self._rate_matrix = RateMatrix(self.trade_pairs, {s: self.price(s) for s in self._trade_graph.symbols},
+                                           table=self._trade_graph.table)
+        return self._rate_matrix
+
+    def active_trade_for_pair(self, exchange_pair, quantity):
+        """
+        Price up a trade pair from this snapshot.
+        :param exchange_pair: TradePair
+        :param quantity: quantity of the left symbol being traded.
+        :return: ActiveTrade, or None if the pair has no rate or either price is unknown.
+        """
+        if exchange_pair.conversion_rate == 0 or\
+                self._prices.get(exchange_pair.left.symbol) is None or \
+                self._prices.get(exchange_pair.right.symbol) is None:
+            return None
+
+        return ActiveTrade(exchange_pair, quantity, self)
+
+    def ranked_trades(self, symbol, quantity=1, direction=TradeDirection.DIR_BOTH, count=0, min_ratio=None):
+        """
+        Price up the trades linked to `symbol`, best ratio first. Ratios are ranked before any ActiveTrade is
+        built, and only the best `count` are kept (with a bounded heap), so trades which won't be returned are
+        never built.
+        :param symbol: str
+        :param quantity: quantity of the left symbol being traded.
+        :param direction: TradeDirection flags. A value of 0 is treated as DIR_BOTH.
+        :param count: int specifying the maximum number of trades to return (0 returns all).
+        :param min_ratio: optional float, only return trades whose ratio exceeds it.
+        :return: list of ActiveTrade objects.
+        """
+        prices = self._prices
+        candidates = []
+        for exchange_pair in self._trade_graph.pairs_for_symbol(symbol, direction=direction):
+            left_price = prices.get(exchange_pair.left.symbol)
+            right_price = prices.get(exchange_pair.right.symbol)
+            if exchange_pair.conversion_rate == 0 or left_price is None or right_price is None:
+                continue
+            # the same arithmetic as ActiveTrade.ratio, so that the ranking matches it exactly
+            ratio = right_price * (quantity * exchange_pair.conversion_rate) / (left_price * quantity)
+            if min_ratio is None or ratio > min_ratio:
+                candidates.append((ratio, exchange_pair))
+
+        if count and count < len(candidates):
+            candidates = heapq.nlargest(count, candidates, key=_first_item)
+        else:
+            candidates.sort(key=_first_item, reverse=True)
+        return [ActiveTrade(exchange_pair, quantity, self) for _, exchange_pair in candidates]
+
+    def get_available_trades_for_holdings(self, holdings, direction=TradeDirection.DIR_BOTH, count=0):
+        """
+        :param holdings: list of (symbol, quantity) tuples.
+        :param direction: TradeDirection flags. A value of 0 is treated as DIR_BOTH.
+        :param count: int specifying the maximum number of trades per holding (0 for all).
+        :return: dict of holding symbol to list of ActiveTrade objects, best ratio first.
+        """
+        holdings_available_trades = {}
+        trades_built = 0
+        with _metrics.timer("trade_ranking"):
+            for holding_sym, holding_quantity in holdings:
+                trades = self.ranked_trades(holding_sym, holding_quantity, direction=direction, count=count)
+                holdings_available_trades[holding_sym] = trades
+                trades_built += len(trades)
+        _metrics.increment("trades_built", trades_built)
+
+        return holdings_available_trades
+
+    def diff(self, previous):
+        """
+        :param previous: MarketSnapshot to compare against, or None.
+        :return: SnapshotDelta describing the changes from `previous` to this snapshot.
+        """
+        return SnapshotDelta(previous, self)
+
+    def __repr__(self):
+        return "MarketSnapshot(v{}, {} pairs, {} prices in {})".format(
+            self._version, len(self._trade_graph), len(self._prices), ",".join(self._currencies))
+
+
+class SnapshotDelta(object):
+    """
+    Changes between two snapshots: symbols whose price changed, and pairs whose rate changed or which were
+    added or removed. Pairs are identified by their (left, right) symbols.
+    """
+
+    def __init__(self, previous, current):
+        """
+        :param previous: MarketSnapshot, or None to treat everything in `current` as added.
+        :param current: MarketSnapshot
+        """
+        self.previous = previous
+        self.current = current
+        self.is_full = previous is None or previous.currency != current.currency
+        self.changed_prices = set()
+        self.changed_rates = set()
+        self.added_pairs = set()
+        self.removed_pairs = set()
+        if self.is_full:
+            self.changed_prices.update(x for x, _ in current.symbol_price_list)
+            self.added_pairs.update(x.key for x in current.trade_pairs)
+            return
+
+        previous_prices = dict(previous.symbol_price_list)
+        current_prices = dict(current.symbol_price_list)
+        for symbol in set(previous_prices).union(current_prices):
+            if previous_prices.get(symbol) != current_prices.get(symbol):
+                self.changed_prices.add(symbol)
+
+        previous_graph = previous.trade_graph
+        current_graph = current.trade_graph
+        if previous_graph is current_graph:
+            return
+        for trade_pair in current_graph.pairs:
+            previous_pair = previous_graph.pair(*trade_pair.key)
+            if previous_pair is None:
+                self.added_pairs.add(trade_pair.key)
+            elif previous_pair.conversion_rate != trade_pair.conversion_rate:
+                self.changed_rates.add(trade_pair.key)
+        for trade_pair in previous_graph.pairs:
+            if current_graph.pair(*trade_pair.key) is None:
+                self.removed_pairs.add(trade_pair.key)
+
+    @property
+    def changed_pairs(self):
+        """
+        :return: set of (left, right) keys for pairs that were added, removed or changed rate.
+        """
+        return self.changed_rates | self.added_pairs | self.removed_pairs
+
+    def affected_pairs_from(self, symbols):
+        """
+        Find the outgoing pairs of `symbols` whose ratio may differ between the two snapshots.
+        :param symbols: set of symbols being traded from.
+        :return: dict of symbol to set of right-hand symbols whose pair needs recomputing. A symbol whose own
+            price changed maps to None, meaning every outgoing pair needs recomputing.
+        """
+        affected = {}
+        for symbol in symbols:
+            if self.is_full or symbol in self.changed_prices:
+                affected[symbol] = None
+        if self.is_full:
+            return affected
+        for left_symbol, right_symbol in self.changed_pairs:
+            if left_symbol in symbols and affected.get(left_symbol, ()) is not None:
+                affected.setdefault(left_symbol, set()).add(right_symbol)
+        for price_symbol in self.changed_prices:
+            for graph in (self.current.trade_graph, self.previous.trade_graph):
+                for trade_pair in graph.incoming(price_symbol):
+                    left_symbol = trade_pair.left.symbol
+                    if left_symbol in symbols and affected.get(left_symbol, ()) is not None:
+                        affected.setdefault(left_symbol, set()).add(price_symbol)
+        return affected
+
+    def __bool__(self):
+        return bool(self.changed_prices or self.changed_pairs)
+
+    def __repr__(self):
+        return "SnapshotDelta({} prices, {} rates, {} added, {} removed)".format(
+            len(self.changed_prices), len(self.changed_rates), len(self.added_pairs), len(self.removed_pairs))
+
+
+class TopTradeTracker(object):
+    """
+    Keeps the best outgoing trade for each holding up to date across snapshots. Only the pairs touched by a
+    SnapshotDelta are re-priced, and each holding keeps a heap of its pair ratios with stale entries discarded
+    lazily when they reach the top.
+    """
+
+    def __init__(self, holdings):
+        """
+        :param holdings: list of (symbol, quantity) tuples.
+        """
+        self.holdings = list(holdings)
+        self.snapshot = None
+        self.pairs_recomputed = 0
+        self._ratios = {symbol: {} for symbol, _ in self.holdings}
+        self._heaps = {symbol: [] for symbol, _ in self.holdings}
+        self._top = {}
+        self._sequence = 0
+
+    def update(self, snapshot):
+        """
+        Apply a new snapshot.
+        :param snapshot: MarketSnapshot
+        :return: dict of holding symbol to its new top ActiveTrade (or None if it no longer has one), for the
+            holdings whose top trade changed. Ordered as `holdings`.
+        """
+        delta = snapshot.diff(self.snapshot)
+        self.snapshot = snapshot
+        affected = delta.affected_pairs_from(set(self._ratios))
+        changed = {}
+        for symbol, quantity in self.holdings:
+            if symbol not in affected:
+                continue
+            right_symbols = affected[symbol]
+            if right_symbols is None:
+                self._ratios[symbol] = {}
+                self._heaps[symbol] = []
+                right_symbols = [x.right.symbol for x in snapshot.trade_graph.outgoing(symbol)]
+            for right_symbol in right_symbols:
+                self._reprice(symbol, right_symbol)
+            top = self._current_top(symbol)
+            if top != self._top.get(symbol):
+                self._top[symbol] = top
+                changed[symbol] = self.top_trade(symbol, quantity)
+        return changed
+
+    def top_trade(self, symbol, quantity=1):
+        """
+        :return: ActiveTrade for the best outgoing pair of `symbol` in the current snapshot, or None.
+        """
+        top = self._top.get(symbol)
+        if top is None:
+            return None
+        return self.snapshot.active_trade_for_pair(self.snapshot.trade_graph.pair(symbol, top[0]), quantity)
+
+    def _reprice(self, symbol, right_symbol):
+        self.pairs_recomputed += 1
+        ratios = self._ratios[symbol]
+        trade_pair = self.snapshot.trade_graph.pair(symbol, right_symbol)
+        trade = self.snapshot.active_trade_for_pair(trade_pair, 1) if trade_pair is not None else None
+        if trade is None:
+            ratios.pop(right_symbol, None)
+            return
+        ratio = trade.ratio
+        ratios[right_symbol] = ratio
+        self._sequence += 1
+        heapq.heappush(self._heaps[symbol], (-ratio, self._sequence, right_symbol))
+
+    def _current_top(self, symbol):
+        ratios = self._ratios[symbol]
+        heap = self._heaps[symbol]
+        if len(heap) > 2 * len(ratios) + 16:
+            heap[:] = [(-ratio, 0, right_symbol) for right_symbol, ratio in ratios.items()]
+            heapq.heapify(heap)
+        while heap:
+            negative_ratio, _, right_symbol = heap[0]
+            if ratios.get(right_symbol) == -negative_ratio:
+                return right_symbol, -negative_ratio
+            heapq.heappop(heap)
+        return None
+
+
+class ActiveTrade(object):
+    __slots__ = ("trade_pair", "starting_quantity", "snapshot")
+
+    def __init__(self, trade_pair, starting_quantity, snapshot):
+        self.trade_pair = trade_pair
+        self.starting_quantity = starting_quantity
+        self.snapshot = snapshot
+
+    @property
+    def left_price(self):
+        return self.snapshot.price(self.trade_pair.left.symbol)
+
+    @property
+    def right_price(self):
+        return self.snapshot.price(self.trade_pair.right.symbol)
+
+    @property
+    def starting_value(self):
+        return self.left_price * self.starting_quantity
+
+    @property
+    def final_value(self):
+        return self.right_price * (self.starting_quantity * self.trade_pair.conversion_rate)
+
+    @property
+    def final_quantity(self):
+        return self.starting_quantity * self.trade_pair.conversion_rate
+
+    @property
+    def ratio(self):
+        return self.final_value / self.starting_value
+
+    @property
+    def is_profitable_trade(self):
+        return self.ratio > 1.0
+
+    @property
+    def is_acceptable_trade(self):
+        return 1.0 > self.ratio > 0.9
+
+    @property
+    def is_bad_trade(self):
+        return not self.is_profitable_trade and not self.is_acceptable_trade
+
+    def to_data(self):
+        """
+        :return: dict() describing the trade, for structured output.
+        """
+        trade_pair = self.trade_pair
+        left_price = self.left_price
+        right_price = self.right_price
+        starting_value = left_price * self.starting_quantity
+        final_value = right_price * (self.starting_quantity * trade_pair.conversion_rate)
+        return {
+            "from": trade_pair.left.symbol,
+            "to": trade_pair.right.symbol,
+            "quantity": self.starting_quantity,
+            "conversion_rate": trade_pair.conversion_rate,
+            "currency": self.snapshot.currency,
+            "from_price": left_price,
+            "to_price": right_price,
+            "value_pre": starting_value,
+            "value_post": final_value,
+            "ratio": final_value / starting_value,
+        }
+
+    def __repr__(self):
+        return "{}({}) -> {}({}) ({})".format(self.trade_pair.left, self.left_price, self.trade_pair.right,
+                                            self.right_price, self.ratio)
@@ -0,0 +1,87 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .metrics import _metrics
+
+
+class RateMatrix(object):
+    """
+    Sparse (edge list) representation of the trade pair graph and a price vector, so that the ratio of every
+    pair can be computed in a single vectorised pass. Requires NumPy.
+    """
+
+    def __init__(self, trade_pairs, symbol_prices, table=None):
+        """
+        :param trade_pairs: list of TradePair objects, one edge each.
+        :param symbol_prices: dict of symbol to price (or None if unknown).
+        :param table: optional PairTable holding `trade_pairs` in the same order, whose arrays are used directly.
+        """
+        self.pairs = list(trade_pairs)
+        if table is not None and len(table) == len(self.pairs):
+            self.symbols = table.symbols + sorted(set(symbol_prices).difference(table.symbol_ids))
+            self.symbol_index = {x: i for i, x in enumerate(self.symbols)}
+            self.left = numpy.frombuffer(table.left, dtype=numpy.intc).astype(numpy.intp)
+            self.right = numpy.frombuffer(table.right, dtype=numpy.intc).astype(numpy.intp)
+            self.rates = numpy.frombuffer(table.rates, dtype=float)
+        else:
+            self.symbols = sorted(set(symbol_prices).union(*[x.symbols for x in self.pairs]))
+            self.symbol_index = {x: i for i, x in enumerate(self.symbols)}
+            self.left = numpy.fromiter((self.symbol_index[x.left.symbol] for x in self.pairs), dtype=numpy.intp,
+                                       count=len(self.pairs))
+            self.right = numpy.fromiter((self.symbol_index[x.right.symbol] for x in self.pairs), dtype=numpy.intp,
+                                        count=len(self.pairs))
+            self.rates = numpy.array([x.conversion_rate or 0 for x in self.pairs], dtype=float)
+        self.prices = numpy.array([symbol_prices.get(x) if symbol_prices.get(x) is not None else numpy.nan
+                                   for x in self.symbols], dtype=float)
+        self._ratios = None
+
+    @property
+    def ratios(self):
+        """
+        :return: array holding the value ratio of each pair, NaN where the pair cannot be priced.
+        """
+        if self._ratios is None:
+            left_prices = self.prices[self.left]
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                ratios = self.rates * self.prices[self.right] / left_prices
+            ratios[(self.rates == 0) | (left_prices == 0) | ~numpy.isfinite(ratios)] = numpy.nan
+            self._ratios = ratios
+        return self._ratios
+
+    def conversion_matrix(self):
+        """
+        :return: dense symbols x symbols array of conversion rates (0 where no pair exists).
+        """
+        matrix = numpy.zeros((len(self.symbols), len(self.symbols)))
+        matrix[self.left, self.right] = self.rates
+        return matrix
+
+    def rank_pairs(self, from_symbols=None, profitable=False, top_only=False, count=0):
+        """
+        Rank the priced pairs by ratio, best first.
+        :param from_symbols: optional iterable restricting the pairs to those traded from these symbols.
+        :param profitable: bool, only include pairs with a ratio above 1.0.
+        :param top_only: bool, only include the best pair for each symbol traded from.
+        :param count: int specifying the maximum number of pairs to return (0 returns all).
+        :return: array of indexes into `pairs`.
+        """
+        with _metrics.timer("pair_ranking"):
+            ratios = self.ratios
+            mask = ~numpy.isnan(ratios)
+            if from_symbols is not None:
+                wanted = numpy.zeros(len(self.symbols), dtype=bool)
+                wanted[[self.symbol_index[x] for x in from_symbols if x in self.symbol_index]] = True
+                mask &= wanted[self.left]
+            candidates = numpy.flatnonzero(mask)
+            if top_only and len(candidates):
+                # order by symbol, then best ratio first, and keep the first entry for each symbol
+                ordered = candidates[numpy.lexsort((-ratios[candidates], self.left[candidates]))]
+                _, first = numpy.unique(self.left[ordered], return_index=True)
+                candidates = ordered[first]
+            if profitable:
+                candidates = candidates[ratios[candidates] > 1.0]
+            if count and count < len(candidates):
+                candidates = candidates[numpy.argpartition(-ratios[candidates], count - 1)[:count]]
+            return candidates[numpy.argsort(-ratios[candidates], kind='stable')]
@@ -0,0 +1,252 @@
+from time import perf_counter
+import threading
+
+from .common import _logger
+
+
+class MetricsTimer(object):
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.registry.record(self.name, perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry(object):
+    """
+    Timers, counters and gauges for the hot paths: HTTP round trips, decoding, refreshes, trade ranking, chain
+    searches and rendering. Timers keep a count, total and maximum (in seconds). Listeners, such as the StatsD
+    exporter, are told about every update as it happens.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.timers = {}
+        self.gauges = {}
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    def timer(self, name):
+        """
+        :return: context manager which records the time spent inside it against the timer `name`.
+        """
+        return MetricsTimer(self, name)
+
+    def record(self, name, seconds):
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = [0, 0.0, 0.0]
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds > timer[2]:
+                timer[2] = seconds
+        for listener in self.listeners:
+            listener.on_timing(name, seconds)
+        return
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for listener in self.listeners:
+            listener.on_count(name, value)
+        return
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+        for listener in self.listeners:
+            listener.on_gauge(name, value)
+        return
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+            self.gauges.clear()
+        return
+
+    def summary(self):
+        """
+        :return: list of lines describing every timer, counter and gauge.
+        """
+        with self._lock:
+            timers = {k: list(v) for (k, v) in self.timers.items()}
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+        lines = []
+        for name, (count, total, maximum) in sorted(timers.items()):
+            lines.append("{:28s} {:8d} calls  total {:10.3f}s  avg {:10.3f}ms  max {:10.3f}ms".format(
+                name, count, total, 1000 * total / count, 1000 * maximum))
+        for name, value in sorted(counters.items()) + sorted(gauges.items()):
+            lines.append("{:28s} {:8g}".format(name, value))
+        return lines
+
+    def prometheus_text(self, prefix="cryptoquery"):
+        """
+        :return: str holding every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            timers = {k: list(v) for (k, v) in self.timers.items()}
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+        lines = []
+        for name, (count, total, maximum) in sorted(timers.items()):
+            metric = "{}_{}_seconds".format(prefix, name)
+            lines.append("# TYPE {} summary".format(metric))
+            lines.append("{}_count {}".format(metric, count))
+            lines.append("{}_sum {!r}".format(metric, total))
+            lines.append("# TYPE {}_max gauge".format(metric))
+            lines.append("{}_max {!r}".format(metric, maximum))
+        for name, value in sorted(counters.items()):
+            lines.append("# TYPE {}_{}_total counter".format(prefix, name))
+            lines.append("{}_{}_total {!r}".format(prefix, name, value))
+        for name, value in sorted(gauges.items()):
+            lines.append("# TYPE {}_{} gauge".format(prefix, name))
+            lines.append("{}_{} {!r}".format(prefix, name, value))
+        return "\n".join(lines) + "\n"
+
+
+_metrics = MetricsRegistry()
+
+
+class PrometheusExporter(object):
+    """
+    Serves the metrics registry in the Prometheus text format at http://HOST:PORT/metrics, from a background
+    thread, for scraping while a watch runs.
+    """
+
+    def __init__(self, registry, port, host="127.0.0.1"):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                _logger.debug("metrics exporter: " + format % args)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-exporter", daemon=True)
+        self._thread.start()
+        _logger.debug("serving metrics at http://{}:{}/metrics".format(self.host, self.port))
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        return
+
+
+class StatsdExporter(object):
+    """
+    Pushes every metrics update to a StatsD server over UDP. Updates are buffered and sent in batches every
+    `interval` seconds from a background thread, so the hot paths never wait on the network.
+    """
+    MAX_PACKET_SIZE = 1432
+
+    def __init__(self, registry, address, prefix="cryptoquery", interval=1.0):
+        """
+        :param registry: MetricsRegistry to listen to.
+        :param address: str "HOST:PORT" of the StatsD server.
+        :param prefix: str prepended to every metric name.
+        :param interval: float number of seconds between sends.
+        """
+        host, _, port = address.rpartition(":")
+        self.registry = registry
+        self.address = (host or "127.0.0.1", int(port))
+        self.prefix = prefix
+        self.interval = interval
+        self._lines = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._socket = None
+        self._thread = None
+
+    def on_timing(self, name, seconds):
+        self._append("{}.{}:{:.3f}|ms".format(self.prefix, name, 1000 * seconds))
+
+    def on_count(self, name, value):
+        self._append("{}.{}:{}|c".format(self.prefix, name, value))
+
+    def on_gauge(self, name, value):
+        self._append("{}.{}:{}|g".format(self.prefix, name, value))
+
+    def _append(self, line):
+        with self._lock:
+            self._lines.append(line)
+
+    def start(self):
+        import socket
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.registry.listeners.append(self)
+        self._thread = threading.Thread(target=self._run, name="statsd-exporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+        return
+
+    def flush(self):
+        with self._lock:
+            lines, self._lines = self._lines, []
+        packet = ""
+        for line in lines:
+            if packet and len(packet) + len(line) + 1 > self.MAX_PACKET_SIZE:
+                self._send(packet)
+                packet = ""
+            packet = packet + "\n" + line if packet else line
+        if packet:
+            self._send(packet)
+        return
+
+    def _send(self, packet):
+        try:
+            self._socket.sendto(packet.encode("utf-8"), self.address)
+        except OSError as e:
+            _logger.debug("could not send metrics to statsd: {}".format(e))
+        return
+
+    def close(self):
+        if self._thread is None:
+            return
+        self.registry.listeners.remove(self)
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+        self._socket.close()
+        self._thread = None
+        return
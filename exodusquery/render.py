@@ -0,0 +1,318 @@
+import itertools
+import json
+import sys
+
+from .common import DEFAULT_TIMEOUT, _json_bytes, _logger, orjson
+from .metrics import _metrics
+
+
+class OutputSink(object):
+    """
+    Where the handlers write their output, one record (a dict) at a time as they produce them: the human-readable
+    tables, or one of the machine-readable formats.
+    """
+    binary = False
+
+    def __init__(self, path="-"):
+        """
+        :param path: str specifying the file to write to, or `-` for stdout.
+        """
+        self.path = path
+        self.records = 0
+        self._file = self._open(path)
+
+    def _open(self, path):
+        if path == "-":
+            return sys.stdout.buffer if self.binary else sys.stdout
+        if self.binary:
+            return open(path, "wb")
+        return open(path, "wt", newline="")
+
+    def write(self, record, layout=None):
+        """
+        :param record: dict() to write.
+        :param layout: optional str naming the table layout of the record. Only the table uses it.
+        """
+        self._write(record)
+        self.records += 1
+        return
+
+    def _write(self, record):
+        raise NotImplementedError()
+
+    def end_group(self):
+        """
+        Mark the end of a group of records written together, such as one watch mode update.
+        """
+        self.flush()
+        return
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+        return
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        if self.path != "-":
+            self._file.close()
+        return
+
+
+class TableSink(OutputSink):
+    """
+    The human-readable tables, logged line by line. Each record is laid out according to the layout it is written
+    with, and records without one are logged as `field: value` pairs.
+    """
+    TRADE_HEADER = "{:5s} | {:8s} | {:32s} | {:8s} | {:32s} | {:20s} | {:34s} | {:34s} ".format(
+        "no", "l_sym", "l_price", "r_sym", "r_price", "conv_rate", "value_pre", "value_post")
+
+    def _open(self, path):
+        return None
+
+    def write(self, record, layout=None):
+        for line in self.LAYOUTS.get(layout, TableSink._record_lines)(self, record):
+            _logger.info(line)
+        self.records += 1
+        return
+
+    def end_group(self):
+        _logger.info("")
+        return
+
+    def _record_lines(self, record):
+        return [", ".join("{}: {}".format(k, v) for (k, v) in record.items())]
+
+    @staticmethod
+    def _trade_line(no, record):
+        return '{:5d} | {:8s} | {:32.25f} | {:8s} | {:32.25f} | {:20.15f} | {:34.25f} | {:34.25f} | {:.10f}'.format(
+            no, record["from"], record["from_price"], record["to"], record["to_price"], record["conversion_rate"],
+            record["value_pre"], record["value_post"], record["ratio"])
+
+    def _trade_lines(self, record):
+        # a header above the first trade of each holding
+        if record["no"] == 0:
+            return [self.TRADE_HEADER, "-" * len(self.TRADE_HEADER), self._trade_line(0, record)]
+        return [self._trade_line(record["no"], record)]
+
+    def _trade_row_lines(self, record):
+        return [self._trade_line(record["no"], record)]
+
+    def _chain_step_lines(self, record):
+        if record["step"] == 0:
+            return ["Chain ROI: {}".format(record["chain_ratio"]), self._trade_line(0, record)]
+        return [self._trade_line(record["step"], record)]
+
+    def _price_lines(self, record):
+        prices = [(k, v) for (k, v) in record.items() if k != "symbol"]
+        if len(prices) == 1:
+            return ["{}: {}".format(record["symbol"], prices[0][1])]
+        return ["{}: {}".format(record["symbol"], ", ".join("{} {}".format(v, k) for (k, v) in prices))]
+
+    def _value_lines(self, record):
+        values = "\t".join("{:.2f} {}".format(v, k) for (k, v) in record.items() if k not in ("symbol", "quantity"))
+        if record["quantity"] is None:
+            return ["--------------------", "{}:\t{}".format(record["symbol"], values), "--------------------"]
+        return ["{}:\t{}".format(record["symbol"], values)]
+
+    def _alert_lines(self, record):
+        return ["ALERT {}: {}".format(record["rule"], record["value"])]
+
+    LAYOUTS = {
+        "trade": _trade_lines,
+        "trade_row": _trade_row_lines,
+        "chain_step": _chain_step_lines,
+        "price": _price_lines,
+        "value": _value_lines,
+        "alert": _alert_lines,
+    }
+
+
+class JSONLinesSink(OutputSink):
+    """
+    One JSON object per line, encoded with orjson when it is installed.
+    """
+
+    def _write(self, record):
+        if orjson is not None:
+            self._file.write(orjson.dumps(record).decode("utf-8") + "\n")
+        else:
+            self._file.write(json.dumps(record) + "\n")
+
+
+class CSVSink(OutputSink):
+    """
+    Comma-separated values, with a header row naming the fields of the first record. Nested values are written as
+    JSON.
+    """
+
+    def __init__(self, path="-"):
+        import csv
+        self._csv = csv
+        super(CSVSink, self).__init__(path)
+        self._writer = None
+
+    def _write(self, record):
+        if self._writer is None:
+            self._writer = self._csv.DictWriter(self._file, fieldnames=list(record), extrasaction="ignore")
+            self._writer.writeheader()
+        self._writer.writerow({k: json.dumps(v) if isinstance(v, (dict, list)) else v for (k, v) in record.items()})
+
+
+class ArrowSink(OutputSink):
+    """
+    Arrow IPC stream. Records are buffered into record batches of `BATCH_SIZE` rows, and the schema is inferred from
+    the first batch. Requires pyarrow.
+    """
+    binary = True
+    BATCH_SIZE = 4096
+
+    def __init__(self, path="-"):
+        import pyarrow
+        self._pyarrow = pyarrow
+        super(ArrowSink, self).__init__(path)
+        self._rows = []
+        self._schema = None
+        self._writer = None
+
+    def _open_writer(self, schema):
+        import pyarrow.ipc
+        return pyarrow.ipc.new_stream(self._file, schema)
+
+    def _write(self, record):
+        self._rows.append(record)
+        if len(self._rows) >= self.BATCH_SIZE:
+            self._write_batch()
+
+    def _write_batch(self):
+        if not self._rows:
+            return
+        table = self._pyarrow.Table.from_pylist(self._rows, schema=self._schema)
+        if self._writer is None:
+            self._schema = table.schema
+            self._writer = self._open_writer(self._schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def flush(self):
+        self._write_batch()
+        super(ArrowSink, self).flush()
+        return
+
+    def close(self):
+        self._write_batch()
+        if self._writer is not None:
+            self._writer.close()
+        super(ArrowSink, self).close()
+        return
+
+
+class ParquetSink(ArrowSink):
+    """
+    Parquet file, with a row group per record batch. Requires pyarrow.
+    """
+
+    def _open_writer(self, schema):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(self._file, schema)
+
+
+OUTPUT_SINKS = {
+    "jsonl": JSONLinesSink,
+    "csv": CSVSink,
+    "arrow": ArrowSink,
+    "parquet": ParquetSink,
+}
+
+
+class RecordListSink(OutputSink):
+    """
+    Keeps the records in memory, in `data`, for sending them on rather than writing them out.
+    """
+
+    def __init__(self):
+        super(RecordListSink, self).__init__(None)
+        self.data = []
+
+    def _open(self, path):
+        return None
+
+    def _write(self, record):
+        self.data.append(record)
+
+
+class WebhookSink(OutputSink):
+    """
+    POSTs each record as a JSON object to a URL, as it is written. Requests which fail are logged and dropped, so
+    an unavailable endpoint never stops the caller.
+    """
+
+    def __init__(self, url, timeout=DEFAULT_TIMEOUT):
+        """
+        :param url: str specifying the URL to POST records to.
+        :param timeout: float number of seconds to wait for each request.
+        """
+        import requests
+
+        super(WebhookSink, self).__init__(url)
+        self.timeout = timeout
+        self._requests = requests
+        self.session = requests.Session()
+
+    def _open(self, path):
+        return None
+
+    def _write(self, record):
+        try:
+            response = self.session.post(self.path, data=_json_bytes(record), timeout=self.timeout,
+                                         headers={"Content-Type": "application/json"})
+            response.raise_for_status()
+        except self._requests.RequestException as e:
+            _metrics.increment("webhook_errors")
+            _logger.warning("Failed to send record to {}: {}".format(self.path, e))
+
+    def close(self):
+        self.session.close()
+        return
+
+
+def open_sink(output_format, path="-"):
+    """
+    :param output_format: str, `table` or one of OUTPUT_SINKS.
+    :param path: str specifying the file to write to, or `-` for stdout. The table is always logged.
+    :return: OutputSink
+    """
+    if output_format == "table":
+        return TableSink()
+    return OUTPUT_SINKS[output_format](path)
+
+
+def display_trade_table(available_trades_for_holdings, max_lines=5, no_header=False, sink=None):
+    """
+    Output trades, grouped by holding. Each group may be any iterable of trades, best first; only the first
+    `max_lines` trades of a group are taken from it.
+    :param available_trades_for_holdings: dict of holding symbol to iterable of ActiveTrade objects.
+    :param max_lines: int specifying the maximum number of trades per holding (0 for all).
+    :param no_header: bool, omit the table header.
+    :param sink: optional OutputSink to write the trades to (default: a table).
+    """
+    with _metrics.timer("render"):
+        rows = _display_trade_table(available_trades_for_holdings, max_lines, "trade_row" if no_header else "trade",
+                                    sink if sink is not None else TableSink())
+    _metrics.increment("rows_rendered", rows)
+    return
+
+
+def _display_trade_table(available_trades_for_holdings, max_lines, layout, sink):
+    rows = 0
+    for holding_sym, available_trades in available_trades_for_holdings.items():
+        available_trades = iter(available_trades) if not max_lines else \
+            itertools.islice(available_trades, max_lines)
+        for i, trade in enumerate(available_trades):
+            record = {"holding": holding_sym, "no": i}
+            record.update(trade.to_data())
+            sink.write(record, layout=layout)
+            rows += 1
+    return rows
@@ -0,0 +1,204 @@
+from time import sleep
+import bisect
+import json
+import struct
+import zlib
+
+from .graph import PairTable, TradePairGraph
+
+
+class SnapshotRecorder(object):
+    """
+    Appends snapshots to a binary record log. Each record is a fixed header followed by a zlib-compressed JSON
+    body; the trade pairs are only stored when they differ from the previous record. A separate index file
+    holds the timestamp and offset of every record so a log can be searched without decompressing it.
+    """
+    HEADER = struct.Struct("<IdB")
+    INDEX_ENTRY = struct.Struct("<dQB")
+    FLAG_PAIRS = 1
+
+    def __init__(self, path):
+        """
+        :param path: str specifying the log file. The index is written alongside it with an `.idx` suffix.
+        """
+        self.path = path
+        self.index_path = path + ".idx"
+        self._log = open(path, "ab")
+        self._index = open(self.index_path, "ab")
+        self._last_graph = None
+        self._last_pairs = None
+        self.records = 0
+
+    def record(self, snapshot):
+        body = {
+            "fetched_at": snapshot.fetched_at,
+            "currency": snapshot.currency,
+            "currencies": list(snapshot.currencies),
+            "prices": snapshot.symbol_price_data,
+        }
+        flags = 0
+        if snapshot.trade_graph is not self._last_graph:
+            pairs = [[x.left.symbol, x.right.symbol, x.conversion_rate] for x in snapshot.trade_pairs]
+            if pairs != self._last_pairs:
+                body["pairs"] = pairs
+                flags |= self.FLAG_PAIRS
+                self._last_pairs = pairs
+            self._last_graph = snapshot.trade_graph
+        payload = zlib.compress(json.dumps(body, separators=(",", ":")).encode("utf-8"))
+        offset = self._log.tell()
+        self._log.write(self.HEADER.pack(len(payload), snapshot.fetched_at or 0.0, flags))
+        self._log.write(payload)
+        self._log.flush()
+        self._index.write(self.INDEX_ENTRY.pack(snapshot.fetched_at or 0.0, offset, flags))
+        self._index.flush()
+        self.records += 1
+        return
+
+    def close(self):
+        self._log.close()
+        self._index.close()
+        return
+
+
+class SnapshotLog(object):
+    """
+    Read access to a log written by SnapshotRecorder.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        with open(path + ".idx", "rb") as f_index:
+            data = f_index.read()
+        entry_size = SnapshotRecorder.INDEX_ENTRY.size
+        for i in range(len(data) // entry_size):
+            self.entries.append(SnapshotRecorder.INDEX_ENTRY.unpack_from(data, i * entry_size))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def first_index_at(self, timestamp):
+        """
+        :return: int index of the first record fetched at or after `timestamp`.
+        """
+        return bisect.bisect_left([x[0] for x in self.entries], timestamp)
+
+    def records(self, start=0, stop=None):
+        """
+        Iterate the records between two indexes, starting from the closest preceding record holding pairs.
+        :return: generator of (fetched_at, list of currencies, TradePairGraph, symbol price data) tuples. The first
+            currency is the one the snapshot was quoted in by default. Empty if the range holds no records.
+        """
+        stop = len(self.entries) if stop is None else min(stop, len(self.entries))
+        if start >= stop:
+            return
+        first = start
+        while first > 0 and not self.entries[first][2] & SnapshotRecorder.FLAG_PAIRS:
+            first -= 1
+        trade_graph = TradePairGraph()
+        with open(self.path, "rb") as f_log:
+            for i in range(first, stop):
+                f_log.seek(self.entries[i][1])
+                length, fetched_at, flags = SnapshotRecorder.HEADER.unpack(f_log.read(SnapshotRecorder.HEADER.size))
+                body = json.loads(zlib.decompress(f_log.read(length)).decode("utf-8"))
+                if flags & SnapshotRecorder.FLAG_PAIRS:
+                    table = PairTable()
+                    for left, right, rate in body["pairs"]:
+                        table.add(left, right, rate)
+                    trade_graph = TradePairGraph.from_table(table)
+                if i >= start:
+                    currencies = body.get("currencies") or [body["currency"]]
+                    yield body["fetched_at"], currencies, trade_graph, body["prices"]
+        return
+
+
+class ReplayClient(object):
+    """
+    Stand-in for ExodusClient which answers each refresh with the next record of a SnapshotLog.
+    """
+
+    def __init__(self, path, start=None, end=None):
+        """
+        :param path: str specifying a log written by SnapshotRecorder.
+        :param start: optional timestamp to start replaying from.
+        :param end: optional timestamp to stop replaying at.
+        """
+        self.log = SnapshotLog(path)
+        self.start = self.log.first_index_at(start) if start is not None else 0
+        self.stop = self.log.first_index_at(end) if end is not None else len(self.log)
+        self.last_fetched_at = None
+        self._records = None
+        self._next = None
+
+    def open(self):
+        self._records = self.log.records(self.start, self.stop)
+        self._next = next(self._records, None)
+        return self
+
+    def close(self):
+        self._records = None
+        self._next = None
+        return
+
+    @property
+    def remaining(self):
+        return self._next is not None
+
+    @property
+    def next_fetched_at(self):
+        return self._next[0] if self._next is not None else None
+
+    def _advance(self, currencies):
+        if self._next is None:
+            if self._records is not None and self.start >= self.stop:
+                raise EOFError("No records to replay from {} in the given range".format(self.log.path))
+            raise EOFError("No more records to replay from {}".format(self.log.path))
+        record, self._next = self._next, next(self._records, None)
+        fetched_at, recorded_currencies, trade_graph, symbol_price_data = record
+        missing = [x for x in currencies if x not in recorded_currencies]
+        if missing:
+            raise ValueError("{} was recorded in {}, not {}".format(self.log.path, ",".join(recorded_currencies),
+                                                                    ",".join(missing)))
+        self.last_fetched_at = fetched_at
+        return trade_graph, symbol_price_data
+
+    def get_market_data(self, symbols_from, currencies, max_age=None, symbols_for=None):
+        return self._advance(currencies)
+
+    def get_current_symbol_price_data(self, symbols_from, currencies, max_age=None):
+        return self._advance(currencies)[1]
+
+    def get_ticker_symbols(self, currency, max_age=None):
+        return None
+
+
+class SnapshotReplayer(object):
+    """
+    Drives an ExodusQuery backed by a ReplayClient through every recorded snapshot, in place of a
+    PollingScheduler. `speed` is a multiple of real time; 0 replays as fast as possible.
+    """
+
+    def __init__(self, query, speed=0, sleeper=sleep):
+        self.query = query
+        self.speed = speed
+        self.sleeper = sleeper
+        self.ticks = 0
+
+    @property
+    def metrics(self):
+        return {"ticks": self.ticks}
+
+    def run(self, on_snapshot, max_ticks=0, fetch_first=False):
+        client = self.query.client
+        snapshot = self.query.refresh() if fetch_first else self.query.snapshot
+        while True:
+            self.ticks += 1
+            on_snapshot(snapshot)
+            if not client.remaining or (max_ticks and self.ticks >= max_ticks):
+                break
+            if self.speed and snapshot.fetched_at is not None:
+                delay = (client.next_fetched_at - snapshot.fetched_at) / self.speed
+                if delay > 0:
+                    self.sleeper(delay)
+            snapshot = self.query.refresh()
+        return self.metrics
@@ -0,0 +1,161 @@
+from time import sleep, monotonic
+import collections
+import random
+
+from .client import RateLimitedError
+from .common import DEFAULT_JITTER, DEFAULT_PAIRS_INTERVAL, DEFAULT_PRICES_INTERVAL, _logger
+from .metrics import _metrics
+
+
+class PollingScheduler(object):
+    """
+    Fixed-rate polling loop for watch mode. Prices and pairs are refreshed on separate intervals, ticks are
+    scheduled against a fixed timeline (so the period does not drift with fetch latency), overdue ticks are
+    skipped and counted, and failures back off exponentially.
+    """
+    DEFAULT_PRICES_INTERVAL = DEFAULT_PRICES_INTERVAL
+    DEFAULT_PAIRS_INTERVAL = DEFAULT_PAIRS_INTERVAL
+    DEFAULT_JITTER = DEFAULT_JITTER
+    DEFAULT_MAX_BACKOFF = 120.0
+    # number of most recent fetch latencies the p95 is taken over
+    LATENCY_WINDOW = 1000
+
+    def __init__(self, query, prices_interval=DEFAULT_PRICES_INTERVAL, pairs_interval=DEFAULT_PAIRS_INTERVAL,
+                 jitter=DEFAULT_JITTER, max_backoff=DEFAULT_MAX_BACKOFF, clock=monotonic, sleeper=sleep):
+        """
+        :param query: ExodusQuery to refresh.
+        :param prices_interval: float number of seconds between price refreshes.
+        :param pairs_interval: float number of seconds between pair refreshes.
+        :param jitter: float fraction of `prices_interval` to randomly delay each tick by.
+        :param max_backoff: float maximum number of seconds to wait after consecutive failures.
+        :param clock: callable returning a monotonic time in seconds.
+        :param sleeper: callable used to wait for a number of seconds.
+        """
+        if prices_interval <= 0 or pairs_interval <= 0:
+            raise ValueError("refresh intervals must be positive")
+        self.query = query
+        self.prices_interval = prices_interval
+        self.pairs_interval = max(pairs_interval, prices_interval)
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.sleeper = sleeper
+        self.ticks = 0
+        self.missed_ticks = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.pairs_refreshes = 0
+        self.fetch_latencies = collections.deque(maxlen=self.LATENCY_WINDOW)
+        self.fetches = 0
+        self._fetch_latency_total = 0.0
+        self._fetch_latency_max = None
+        self._consecutive_errors = 0
+        self._random = random.Random()
+
+    @property
+    def metrics(self):
+        """
+        :return: dict() summarising the ticks run and missed, failures, and the fetch latency in seconds. The p95 is
+            taken over the last LATENCY_WINDOW fetches.
+        """
+        latencies = sorted(self.fetch_latencies)
+        return {
+            "ticks": self.ticks,
+            "missed_ticks": self.missed_ticks,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "pairs_refreshes": self.pairs_refreshes,
+            "fetch_latency_avg": self._fetch_latency_total / self.fetches if self.fetches else None,
+            "fetch_latency_p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+            "fetch_latency_max": self._fetch_latency_max,
+        }
+
+    def _record_fetch(self, latency):
+        self.fetch_latencies.append(latency)
+        self.fetches += 1
+        self._fetch_latency_total += latency
+        if self._fetch_latency_max is None or latency > self._fetch_latency_max:
+            self._fetch_latency_max = latency
+        return
+
+    def backoff_delay(self, retry_after=None):
+        """
+        :param retry_after: optional number of seconds requested by the server.
+        :return: float number of seconds to wait after the current run of consecutive failures.
+        """
+        delay = min(self.max_backoff, self.prices_interval * 2 ** self._consecutive_errors)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    def run(self, on_snapshot, max_ticks=0, fetch_first=False):
+        """
+        Run the polling loop until interrupted.
+        :param on_snapshot: callable taking each new MarketSnapshot.
+        :param max_ticks: int specifying the number of ticks to run for (0 runs forever).
+        :param fetch_first: bool, refresh before the first tick rather than using the query's current snapshot.
+        :return: dict() of metrics.
+        """
+        import requests
+
+        start = self.clock()
+        next_tick = start
+        next_pairs = start + self.pairs_interval
+        first = True
+        try:
+            while not max_ticks or self.ticks < max_ticks:
+                now = self.clock()
+                if now < next_tick:
+                    self.sleeper(next_tick - now)
+                    now = self.clock()
+                elif now - next_tick >= self.prices_interval:
+                    missed = int((now - next_tick) // self.prices_interval)
+                    self.missed_ticks += missed
+                    _metrics.increment("scheduler_missed_ticks", missed)
+                    next_tick += missed * self.prices_interval
+                    _logger.debug("scheduler is running behind, skipped {} ticks".format(missed))
+                next_tick += self.prices_interval
+
+                if first and not fetch_first:
+                    snapshot = self.query.snapshot
+                else:
+                    refresh_pairs = now >= next_pairs
+                    fetch_start = self.clock()
+                    try:
+                        snapshot = self.query.refresh(pairs=refresh_pairs, max_age=0)
+                    except RateLimitedError as e:
+                        self.rate_limited += 1
+                        _metrics.increment("scheduler_rate_limited")
+                        next_tick = self._back_off(e, e.retry_after)
+                        continue
+                    except requests.RequestException as e:
+                        next_tick = self._back_off(e)
+                        continue
+                    except Exception as e:
+                        # a malformed response must not end the watch any more than a failed request
+                        next_tick = self._back_off("{}: {}".format(type(e).__name__, e))
+                        continue
+                    self._record_fetch(self.clock() - fetch_start)
+                    if refresh_pairs:
+                        self.pairs_refreshes += 1
+                        while next_pairs <= now:
+                            next_pairs += self.pairs_interval
+                first = False
+                self._consecutive_errors = 0
+                self.ticks += 1
+                _metrics.increment("scheduler_ticks")
+                on_snapshot(snapshot)
+                if self.jitter:
+                    next_tick += self._random.uniform(0, self.jitter * self.prices_interval)
+        except KeyboardInterrupt:
+            pass
+        _logger.debug("scheduler metrics: {}".format(self.metrics))
+        return self.metrics
+
+    def _back_off(self, error, retry_after=None):
+        self.errors += 1
+        _metrics.increment("scheduler_errors")
+        delay = self.backoff_delay(retry_after)
+        self._consecutive_errors += 1
+        _logger.warning("refresh failed ({}), retrying in {:.1f}s".format(error, delay))
+        return self.clock() + delay
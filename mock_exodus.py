@@ -0,0 +1,255 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from time import sleep
+import argparse
+import random
+import threading
+import sys
+import json
+import logging
+
+from exodusquery import ExodusQuery, MarketSnapshot, TradeElement, TradePair
+
+_logger = logging.getLogger()
+
+
+class SyntheticMarket(object):
+    """
+    Randomly generated market of symbols, prices and trade pairs for exercising ExodusQuery without the public
+    API. The first symbols are the real ExodusQuery.ALL_SYMBOLS, and any beyond those get generated names.
+
+    Pair rates are the fair rate between the two prices less a random spread, so single trades are normally
+    unprofitable. `cycles` closed loops of `cycle_length` trades are then made profitable by `cycle_profit`
+    overall, to give the chain search something to find.
+    """
+    EXCHANGE_RATES = {"GBP": 1.0, "USD": 1.27, "EUR": 1.17, "JPY": 190.0}
+
+    def __init__(self, symbols=140, density=0.05, cycles=0, cycle_length=3, cycle_profit=1.01, spread=0.01,
+                 currency="GBP", seed=None):
+        """
+        :param symbols: int number of symbols in the market.
+        :param density: float probability of a pair existing between any two symbols, in each direction.
+        :param cycles: int number of profitable cycles to inject.
+        :param cycle_length: int number of trades in each injected cycle.
+        :param cycle_profit: float overall ratio of each injected cycle.
+        :param spread: float maximum fraction of value lost on an ordinary trade.
+        :param currency: str specifying the currency prices are quoted in.
+        :param seed: optional seed for a reproducible market.
+        """
+        self.random = random.Random(seed)
+        self.currency = currency
+        self.symbols = list(ExodusQuery.ALL_SYMBOLS[:symbols])
+        self.symbols.extend("SYN{}".format(i) for i in range(symbols - len(self.symbols)))
+        self.prices = {x: 10 ** self.random.uniform(-3, 4) for x in self.symbols}
+        self.spreads = {}
+        for left in self.symbols:
+            for right in self.symbols:
+                if left != right and self.random.random() < density:
+                    self.spreads[(left, right)] = 1 - self.random.uniform(0, spread)
+        self.cycles = []
+        for _ in range(cycles):
+            cycle = self.random.sample(self.symbols, cycle_length)
+            for left, right in zip(cycle, cycle[1:] + cycle[:1]):
+                self.spreads[(left, right)] = cycle_profit ** (1.0 / cycle_length)
+            self.cycles.append(cycle)
+
+    def rate(self, left, right):
+        return self.prices[left] / self.prices[right] * self.spreads[(left, right)]
+
+    def step(self, volatility):
+        """
+        Move every price by a random walk step.
+        :param volatility: float standard deviation of the relative change in each price.
+        """
+        for symbol in self.symbols:
+            self.prices[symbol] *= max(0.01, 1 + self.random.gauss(0, volatility))
+        return
+
+    def pairs_data(self):
+        """
+        :return: list of dict() in the format of the `v2/pairs` response data.
+        """
+        return [{"pair": "{}_{}".format(left, right), "rate": self.rate(left, right)} for left, right in self.spreads]
+
+    def price_data(self, symbols_from, currencies):
+        """
+        :return: dict() in the format of the `current-price` response. Currencies other than `currency` are
+            converted at fixed exchange rates.
+        """
+        conversions = {x: self.EXCHANGE_RATES.get(x, 1.0) / self.EXCHANGE_RATES.get(self.currency, 1.0)
+                       for x in currencies}
+        return {x: {currency: self.prices[x] * conversions[currency] for currency in currencies}
+                for x in symbols_from if x in self.prices}
+
+    def snapshot(self, version=0):
+        """
+        :return: MarketSnapshot of the current market, without going through HTTP.
+        """
+        trade_pairs = [TradePair(TradeElement(left), TradeElement(right), self.rate(left, right))
+                       for left, right in self.spreads]
+        return MarketSnapshot(trade_pairs, self.price_data(self.symbols, [self.currency]), self.currency,
+                              version=version)
+
+
+class MockExodusRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the `current-price`, `ticker` and `v2/pairs` endpoints from the server's SyntheticMarket, with
+    optional latency and injected failures.
+    """
+
+    def log_message(self, format, *args):
+        _logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _inject_faults(self):
+        server = self.server
+        if server.latency:
+            sleep(max(0.0, server.random.gauss(server.latency, server.latency_jitter)))
+        roll = server.random.random()
+        if roll < server.rate_limit_rate:
+            self._send_json(429, {"status": "error", "message": "rate limited"}, {"Retry-After": "1"})
+            return True
+        if roll < server.rate_limit_rate + server.error_rate:
+            self._send_json(503, {"status": "error", "message": "injected failure"})
+            return True
+        return False
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        return
+
+    def _prices(self, symbols_from, currencies):
+        server = self.server
+        with server.lock:
+            if server.volatility:
+                server.market.step(server.volatility)
+            return server.market.price_data(symbols_from, currencies)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if self._inject_faults():
+            return
+        if url.path == "/v2/pairs":
+            with self.server.lock:
+                self._send_json(200, {"status": "success", "data": self.server.market.pairs_data()})
+        elif url.path == "/ticker":
+            query = parse_qs(url.query)
+            symbols_from = ",".join(query.get("from", [])).split(",") if query.get("from") else \
+                self.server.market.symbols
+            currencies = ",".join(query.get("to", [self.server.market.currency])).split(",")
+            self._send_json(200, self._prices(symbols_from, currencies))
+        else:
+            self._send_json(404, {"status": "error", "message": "not found"})
+        return
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"status": "error", "message": "invalid json"})
+            return
+        if self._inject_faults():
+            return
+        if url.path == "/current-price":
+            assets = request.get("assets", {})
+            self._send_json(200, self._prices(assets.get("from", []), assets.get("to", [])))
+        else:
+            self._send_json(404, {"status": "error", "message": "not found"})
+        return
+
+
+class MockExodusServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, market, latency=0.0, latency_jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 volatility=0.0, seed=None):
+        """
+        :param address: (host, port) tuple to listen on. Port 0 picks a free port.
+        :param market: SyntheticMarket to serve.
+        :param latency: float mean number of seconds to delay each response by.
+        :param latency_jitter: float standard deviation of the delay.
+        :param error_rate: float probability of answering with HTTP 503.
+        :param rate_limit_rate: float probability of answering with HTTP 429.
+        :param volatility: float size of the random price movement applied on every price request.
+        :param seed: optional seed for reproducible fault injection.
+        """
+        ThreadingHTTPServer.__init__(self, address, MockExodusRequestHandler)
+        self.market = market
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.volatility = volatility
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+
+def main(argv):
+    args = parse_arguments(argv)
+    market = SyntheticMarket(symbols=args.symbols, density=args.density, cycles=args.cycles,
+                             cycle_length=args.cycle_length, cycle_profit=args.cycle_profit, spread=args.spread,
+                             currency=args.currency.upper(), seed=args.seed)
+    server = MockExodusServer((args.host, args.port), market, latency=args.latency,
+                              latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                              rate_limit_rate=args.rate_limit_rate, volatility=args.volatility, seed=args.seed)
+    _logger.info("serving {} symbols and {} pairs on {}".format(len(market.symbols), len(market.spreads),
+                                                                server.base_url))
+    for cycle in market.cycles:
+        _logger.info("injected cycle: {}".format(" -> ".join(cycle + cycle[:1])))
+    _logger.info("use: cryptoquery.py --no-cache --pricing-url {0} --exchange-url {0} ...".format(server.base_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description="Local stand-in for the Exodus pricing and exchange APIs")
+
+    parser.add_argument("--host", default="127.0.0.1", help="Specify the address to listen on (default:127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="Specify the port to listen on (default:8080)")
+    parser.add_argument("--currency", default="GBP", help="Specify the currency to quote prices in (default:GBP)")
+    parser.add_argument("--seed", type=int, help="Specify a seed to generate a reproducible market")
+    parser.add_argument("--symbols", type=int, default=140, help="Specify the number of symbols (default:140)")
+    parser.add_argument("--density", type=float, default=0.05,
+                        help="Specify the probability of a pair between any two symbols (default:0.05)")
+    parser.add_argument("--spread", type=float, default=0.01,
+                        help="Specify the maximum fraction of value lost on an ordinary trade (default:0.01)")
+    parser.add_argument("--cycles", type=int, default=0,
+                        help="Specify the number of profitable cycles to inject (default:0)")
+    parser.add_argument("--cycle-length", type=int, default=3,
+                        help="Specify the number of trades in each injected cycle (default:3)")
+    parser.add_argument("--cycle-profit", type=float, default=1.01,
+                        help="Specify the overall ratio of each injected cycle (default:1.01)")
+    parser.add_argument("--volatility", type=float, default=0.0,
+                        help="Specify the size of the random price movement on each price request (default:0)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Specify the mean delay in seconds added to each response (default:0)")
+    parser.add_argument("--latency-jitter", type=float, default=0.0,
+                        help="Specify the standard deviation of the added delay (default:0)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Specify the fraction of requests answered with HTTP 503 (default:0)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="Specify the fraction of requests answered with HTTP 429 (default:0)")
+
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(sys.argv[1:])